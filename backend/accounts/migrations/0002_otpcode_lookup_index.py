@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='otpcode',
+            index=models.Index(condition=models.Q(('verified', False)), fields=['identifier', 'channel', '-created_at'], name='otp_lookup_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 
 
@@ -24,6 +25,14 @@ class OTPCode(models.Model):
     verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # verify_otp: latest unverified code for an identifier.
+            models.Index(
+                fields=["identifier", "channel", "-created_at"], condition=Q(verified=False), name="otp_lookup_idx"
+            ),
+        ]
+
     def is_expired(self):
         return timezone.now() > self.expires_at
 
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_checkout_payment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='checkoutaddress',
+            index=models.Index(fields=['session_key', '-is_default', '-updated_at'], name='address_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='checkoutaddress',
+            index=models.Index(fields=['user', '-is_default', '-updated_at'], name='address_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='checkoutorder',
+            index=models.Index(fields=['session_key', '-created_at'], name='order_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='checkoutorder',
+            index=models.Index(fields=['user', '-created_at'], name='order_user_idx'),
+        ),
+    ]
@@ -26,6 +26,10 @@ class CheckoutAddress(models.Model):
 
     class Meta:
         ordering = ["-is_default", "-updated_at"]
+        indexes = [
+            models.Index(fields=["session_key", "-is_default", "-updated_at"], name="address_session_idx"),
+            models.Index(fields=["user", "-is_default", "-updated_at"], name="address_user_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.pincode}"
@@ -47,6 +51,12 @@ class CheckoutOrder(models.Model):
     items = models.JSONField(default=list)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["session_key", "-created_at"], name="order_session_idx"),
+            models.Index(fields=["user", "-created_at"], name="order_user_idx"),
+        ]
+
     def __str__(self):
         return self.razorpay_order_id
 
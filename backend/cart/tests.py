@@ -1,3 +1,59 @@
-from django.test import TestCase
+from store.tests import QueryBudgetTestCase
 
-# Create your tests here.
+from .models import CheckoutAddress, CheckoutOrder
+
+
+class CheckoutQueryBudgetTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        session = self.client.session
+        session["cart_items"] = ["product-1", "product-2"]
+        session.save()
+        self.session_key = session.session_key
+        self.address = CheckoutAddress.objects.create(
+            session_key=self.session_key,
+            name="Asha",
+            phone="9999999999",
+            address_line1="1 MG Road",
+            city="Bengaluru",
+            state="Karnataka",
+            pincode="560001",
+        )
+
+    def select_address(self):
+        session = self.client.session
+        session["checkout_address_id"] = self.address.id
+        session.save()
+
+    def test_address(self):
+        self.assertQueryBudget("/checkout/address/", 4)
+
+    def test_select_address(self):
+        response = self.assertQueryBudget(
+            "/checkout/address/",
+            5,
+            method="post",
+            data={"address_id": self.address.id},
+            status=302,
+        )
+        self.assertEqual(response["Location"], "/checkout/payment/")
+
+    def test_payment(self):
+        self.select_address()
+        response = self.assertQueryBudget("/checkout/payment/", 3)
+        self.assertEqual(len(response.context["cart_items"]), 2)
+
+    def test_summary_and_orders(self):
+        order = CheckoutOrder.objects.create(
+            session_key=self.session_key,
+            address=self.address,
+            amount_paise=199800,
+            razorpay_order_id="order_test",
+            status="paid",
+        )
+        session = self.client.session
+        session["checkout_order_id"] = order.id
+        session.save()
+        self.assertQueryBudget("/checkout/summary/", 3)
+        self.assertQueryBudget(f"/orders/{order.id}/", 3)
+        self.assertQueryBudget("/orders/", 3)
@@ -63,6 +63,7 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "store.middleware.MediaFilesMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -103,6 +104,40 @@ DATABASES = {
 }
 
 
+# Cache
+# Shared across gunicorn workers so catalog version bumps reach every process.
+# The file-based defaults suit a single host and local development; point
+# both aliases at Redis (django.core.cache.backends.redis.RedisCache) when
+# running several hosts or a large catalog.
+#
+# Catalog version keys (store.catalog) get an alias of their own: the default
+# cache culls a random share of its entries once it holds MAX_ENTRIES, and
+# losing a version key discards every structure built against it. The
+# versions alias only ever holds a few keys, so it never reaches its cull.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / '.cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000')),
+        },
+    },
+    'catalog_versions': {
+        'BACKEND': os.getenv('VERSION_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('VERSION_CACHE_LOCATION', str(BASE_DIR / '.cache-versions')),
+        'TIMEOUT': None,
+    },
+}
+
+
+# Product search
+# "memory" keeps an inverted index in each worker; "fts5" queries an SQLite
+# FTS5 table kept current by triggers (rebuild it with rebuild_search_index).
+
+STORE_SEARCH_BACKEND = os.getenv('STORE_SEARCH_BACKEND', 'memory')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -149,10 +184,24 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
+# Identifies the deployed code in page ETags (store.conditional), so pages
+# revalidated after a deploy that changed templates or assets are sent again
+# rather than answered with a 304. Set it to the release or commit; the Docker
+# image takes it from the BUILD_ID build argument. Unset, the start time of the
+# first worker to serve a page stands in until the version cache is cleared.
+BUILD_ID = os.getenv("BUILD_ID", "")
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / "media"
 
 SERVE_MEDIA_FILES = os.getenv("SERVE_MEDIA_FILES", "False").lower() == "true"
+# Hand served media to the front proxy instead of streaming it from Python:
+# "x-accel-redirect" (nginx, with an internal location aliasing MEDIA_ROOT at
+# MEDIA_ACCEL_REDIRECT_PREFIX) or "x-sendfile" (Apache, lighttpd).
+MEDIA_SENDFILE = os.getenv("MEDIA_SENDFILE", "")
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX", "/protected-media/")
+# Browser cache lifetime of media not named by content hash.
+MEDIA_CACHE_MAX_AGE = 3600
 
 PINCODE_API_URL = "https://api.postalpincode.in/pincode/{pincode}"
 PINCODE_DEFAULT_DELIVERY_DAYS = 3
@@ -3,7 +3,7 @@ from django.contrib import admin
 from django.urls import path, include
 from accounts.views import logout_view
 from django.conf import settings
-from django.views.static import serve
+from store.media_views import media_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -18,7 +18,7 @@ urlpatterns = [
 if settings.DEBUG or getattr(settings, "SERVE_MEDIA_FILES", False):
     media_url = settings.MEDIA_URL.lstrip("/")
     urlpatterns += [
-        path(f"{media_url}<path:path>", serve, {"document_root": settings.MEDIA_ROOT}),
+        path(f"{media_url}<path:path>", media_view),
     ]
 
 
@@ -1,5 +1,15 @@
 from django.contrib import admin
-from .models import Banner, Brand, Category, DeliveryPincode, Product, ProductImage
+from .models import (
+    Banner,
+    Brand,
+    BrandSummary,
+    Category,
+    DeliveryPincode,
+    Product,
+    ProductImage,
+    PromoCollection,
+    RenditionJob,
+)
 
 
 @admin.register(Brand)
@@ -9,6 +19,15 @@ class BrandAdmin(admin.ModelAdmin):
     search_fields = ("name",)
 
 
+@admin.register(BrandSummary)
+class BrandSummaryAdmin(admin.ModelAdmin):
+    list_display = ("brand", "product_count", "min_price")
+    readonly_fields = ("brand", "product_count", "min_price", "image")
+
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ("name", "slug", "active")
@@ -58,8 +77,24 @@ class BannerAdmin(admin.ModelAdmin):
     list_editable = ("order", "active")
 
 
+@admin.register(PromoCollection)
+class PromoCollectionAdmin(admin.ModelAdmin):
+    list_display = ("title", "slug", "keyword", "active")
+    list_filter = ("active",)
+    prepopulated_fields = {"slug": ("title",)}
+    search_fields = ("title", "keyword")
+
+
 @admin.register(DeliveryPincode)
 class DeliveryPincodeAdmin(admin.ModelAdmin):
     list_display = ("pincode", "city", "state", "delivery_days", "active", "source", "last_checked")
     list_filter = ("active", "source", "state")
     search_fields = ("pincode", "city", "state")
+
+
+@admin.register(RenditionJob)
+class RenditionJobAdmin(admin.ModelAdmin):
+    list_display = ("digest", "status", "attempts", "available_at", "updated_at")
+    list_filter = ("status",)
+    search_fields = ("digest",)
+    readonly_fields = ("digest", "force", "attempts", "last_error", "claimed_by", "updated_at")
@@ -4,7 +4,10 @@ from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from .brand_summaries import refresh_brand_summaries
+from .filter_spec import FilterSpec
 from .models import Banner, Brand, Category, Product, ProductImage
+from .promos import refresh_collections
 from .serializers import (
     BannerSerializer,
     BrandSerializer,
@@ -27,7 +30,7 @@ class BannerViewSet(viewsets.ModelViewSet):
 
 
 class BrandViewSet(viewsets.ModelViewSet):
-    queryset = Brand.objects.all()
+    queryset = Brand.objects.select_related("summary")
     serializer_class = BrandSerializer
 
     def get_permissions(self):
@@ -50,6 +53,18 @@ class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ("list", "retrieve"):
+            queryset = queryset.prefetch_related("images")
+        if self.action == "list":
+            # ?brand=fossil&price=1500-1999 etc., parsed and validated like the
+            # listing pages; price is an IN lookup on the indexed bucket column.
+            spec = FilterSpec.from_query(self.request.query_params)
+            if spec.selections:
+                queryset = queryset.filter(spec.as_q())
+        return queryset
+
     def get_serializer_class(self):
         if self.action in ("list", "retrieve"):
             return ProductReadSerializer
@@ -73,6 +88,8 @@ class ProductViewSet(viewsets.ModelViewSet):
             product = Product.objects.create(**validated)
             for image_payload in images_data:
                 ProductImage.objects.create(product=product, **image_payload)
+        # Image signals filled in the card columns behind this instance's back.
+        product.refresh_from_db()
 
         return Response(ProductSerializer(product).data, status=status.HTTP_201_CREATED)
 
@@ -83,6 +100,10 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer = ProductSerializer(data=request.data, many=True)
         serializer.is_valid(raise_exception=True)
         products = Product.objects.bulk_create([Product(**item) for item in serializer.validated_data])
+        # bulk_create skips post_save, so promo memberships and brand summaries
+        # (and with them the catalog version) have to be refreshed here.
+        refresh_collections()
+        refresh_brand_summaries()
         return Response(ProductSerializer(products, many=True).data, status=status.HTTP_201_CREATED)
 
 
@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .catalog import bump_version
+from .models import IMAGE_DETAILS, Brand, BrandSummary, Product
+
+# Product card columns -> BrandSummary columns for the summary image.
+IMAGE_COLUMNS = {
+    "primary_image": "image",
+    **{f"primary_image_{detail}": f"image_{detail}" for detail in IMAGE_DETAILS},
+}
+
+
+def _active_products():
+    return Product.objects.filter(is_active=True)
+
+
+def _summary_image(row):
+    # The summary image columns for a product card row, or blank ones.
+    if row is None:
+        return {column: BrandSummary._meta.get_field(column).get_default() for column in IMAGE_COLUMNS.values()}
+    return {IMAGE_COLUMNS[column]: value for column, value in row.items() if column in IMAGE_COLUMNS}
+
+
+def _newest_images(products):
+    # Card image of the newest product that has one, per brand.
+    return products.exclude(primary_image="").order_by("-created_at", "-id").values(*IMAGE_COLUMNS)
+
+
+def refresh_brand_summaries():
+    """Recompute every brand's summary from scratch."""
+    stats = {
+        row["brand_id"]: row
+        for row in _active_products()
+        .filter(brand__isnull=False)
+        .values("brand_id")
+        .annotate(product_count=Count("id"), min_price=Min("base_price"))
+        .order_by()
+    }
+    images = {}
+    rows = _active_products().exclude(primary_image="").order_by("brand_id", "-created_at", "-id")
+    for row in rows.values("brand_id", *IMAGE_COLUMNS):
+        images.setdefault(row["brand_id"], row)
+    with transaction.atomic():
+        BrandSummary.objects.all().delete()
+        BrandSummary.objects.bulk_create(
+            [
+                BrandSummary(
+                    brand_id=brand_id,
+                    product_count=stats.get(brand_id, {}).get("product_count", 0),
+                    min_price=stats.get(brand_id, {}).get("min_price"),
+                    **_summary_image(images.get(brand_id)),
+                )
+                for brand_id in Brand.objects.values_list("id", flat=True)
+            ]
+        )
+        bump_version()
+
+
+def sync_brand_summaries(brand_ids):
+    """Recompute the summaries of ``brand_ids``, each from that brand's products alone."""
+    brand_ids = {brand_id for brand_id in brand_ids if brand_id is not None}
+    for brand_id in brand_ids:
+        products = _active_products().filter(brand_id=brand_id)
+        stats = products.aggregate(product_count=Count("id"), min_price=Min("base_price"))
+        # update() rather than update_or_create(): a brand being deleted has
+        # already lost its summary by the time its products' signals fire.
+        BrandSummary.objects.filter(brand_id=brand_id).update(
+            **_summary_image(_newest_images(products).first()), **stats
+        )
+    if brand_ids:
+        # Bump after the write so a reader can't cache the old summary under the
+        # version bumped by the product's own save.
+        bump_version()
@@ -0,0 +1,85 @@
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+
+CATALOG = "catalog"
+BANNERS = "banners"
+
+VERSION_KEY = "store:version:{scope}"
+
+# Cache alias holding the version keys, kept apart from the culled default.
+VERSION_CACHE = "catalog_versions"
+
+
+def _versions():
+    return caches[VERSION_CACHE] if VERSION_CACHE in settings.CACHES else cache
+
+
+def get_version(scope=CATALOG):
+    versions = _versions()
+    key = VERSION_KEY.format(scope=scope)
+    version = versions.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not versions.add(key, version, timeout=None):
+            version = versions.get(key, version)
+    return version
+
+
+def _set_version(scopes):
+    version = time.time_ns()
+    _versions().set_many({VERSION_KEY.format(scope=scope): version for scope in scopes}, timeout=None)
+
+
+def bump_version(*scopes):
+    # Versions are nanosecond timestamps rather than counters so that two
+    # workers bumping concurrently can never settle on a value a reader has
+    # already built against.
+    scopes = scopes or (CATALOG,)
+    _set_version(scopes)
+    if transaction.get_connection().in_atomic_block:
+        # Readers may rebuild between the write and the commit; bump again once
+        # the data is visible so those builds are discarded.
+        transaction.on_commit(lambda: _set_version(scopes))
+
+
+def versioned(*scopes, ttl=None):
+    """Memoize a builder per worker process until one of ``scopes`` is bumped.
+
+    With ``ttl`` (seconds) the value is also rebuilt once it is that old, for
+    data that can change without going through a signal.
+    """
+    scopes = scopes or (CATALOG,)
+
+    def decorator(builder):
+        lock = threading.Lock()
+        state = {"key": None, "value": None, "built_at": 0.0}
+
+        def fresh(key):
+            if state["key"] != key:
+                return False
+            return ttl is None or time.monotonic() - state["built_at"] < ttl
+
+        @wraps(builder)
+        def wrapper():
+            key = tuple(get_version(scope) for scope in scopes)
+            if fresh(key):
+                return state["value"]
+            with lock:
+                if not fresh(key):
+                    state["value"] = builder()
+                    state["key"] = key
+                    state["built_at"] = time.monotonic()
+            return state["value"]
+
+        def invalidate():
+            state["key"] = None
+
+        wrapper.invalidate = invalidate
+        return wrapper
+
+    return decorator
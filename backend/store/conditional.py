@@ -0,0 +1,59 @@
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from .catalog import CATALOG, _versions, get_version
+
+BUILD_KEY = "store:build:{build_id}"
+
+# Offered as the shared deploy time by whichever worker asks first.
+STARTED = time.time_ns()
+
+
+def deployed_at():
+    """Nanosecond time the running build first served, shared by every worker.
+
+    It is kept in the version cache under the build's id, so workers started
+    at different moments still tag pages alike. Without a BUILD_ID it is set
+    once and outlives restarts: clear the version cache when deploying.
+    """
+    versions = _versions()
+    key = BUILD_KEY.format(build_id=settings.BUILD_ID)
+    deployed = versions.get(key)
+    if deployed is None:
+        deployed = STARTED
+        if not versions.add(key, deployed, timeout=None):
+            deployed = versions.get(key, deployed)
+    return deployed
+
+
+def catalog_etag(request, *args, **kwargs):
+    """Strong ETag for a page that only changes when the catalog or the deployed code does.
+
+    The navbar greets signed-in users by name, so their pages are tagged
+    apart from the anonymous one.
+    """
+    user = request.user.pk if request.user.is_authenticated else "anon"
+    return f"{get_version(CATALOG)}-{settings.BUILD_ID}-{deployed_at()}-{user}"
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    # Signed-in pages have no date to give: logging in changes them without a write.
+    if request.user.is_authenticated:
+        return None
+    # Versions are nanosecond timestamps; the date is rounded up to a whole
+    # second and withheld until that second has passed, so a later write in the
+    # same second can never share it.
+    changed = max(get_version(CATALOG), deployed_at())
+    seconds = -(-changed // 1_000_000_000)
+    if time.time_ns() < seconds * 1_000_000_000:
+        return None
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+def catalog_conditional(view):
+    """Answer revalidations of ``view`` with a 304 while the catalog is unchanged, without running it."""
+    return vary_on_cookie(condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)(view))
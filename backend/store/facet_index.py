@@ -0,0 +1,165 @@
+from bisect import bisect_left, bisect_right
+
+from .catalog import versioned
+from .models import Product, PromoCollection
+from .price_buckets import buckets_for, get_price_ranges
+
+# Facet name (as used in listing query strings) -> Product lookup.
+FACET_FIELDS = {
+    "category": "category__slug",
+    "brand": "brand__slug",
+    "shape": "shape",
+    "frame_type": "frame_type",
+    "gender": "gender",
+    "material": "frame_material",
+    "color": "color",
+    "size": "size",
+    "weight_group": "weight_group",
+    "price_bucket": "price_bucket",
+    "is_active": "is_active",
+}
+
+
+# Facets shown in the listing sidebar, in query string order.
+FILTER_FACETS = ("brand", "shape", "frame_type", "gender", "material", "color", "size", "weight_group", "price")
+
+
+class FacetIndex:
+    """Bitset per facet value over the whole catalog, bit ``i`` being ``ids[i]``."""
+
+    def __init__(self, ids, bitsets, brand_names=None, price_ranges=()):
+        self.ids = ids
+        self.bitsets = bitsets
+        self.brand_names = brand_names or {}
+        self.price_ranges = price_ranges
+        self.all = (1 << len(ids)) - 1
+
+    @classmethod
+    def build(cls):
+        lookups = list(FACET_FIELDS.values())
+        rows = Product.objects.order_by("id").values_list("id", "brand__name", "brand__active", *lookups)
+        ids = []
+        bitsets = {facet: {} for facet in FACET_FIELDS}
+        brand_names = {}
+        positions = {}
+        for position, (product_id, brand_name, brand_active, *values) in enumerate(rows):
+            positions[product_id] = position
+            ids.append(product_id)
+            bit = 1 << position
+            for facet, value in zip(FACET_FIELDS, values):
+                bitsets[facet][value] = bitsets[facet].get(value, 0) | bit
+                if facet == "brand" and brand_active:
+                    brand_names[value] = brand_name
+        # Sidebar price ranges are unions of buckets, derived from the histogram.
+        price_ranges = get_price_ranges()
+        bitsets["price"] = {
+            price_range.label: cls._union(bitsets["price_bucket"], price_range.buckets) for price_range in price_ranges
+        }
+        # Promo collection slug -> members, from the materialized membership table.
+        bitsets["promo"] = {}
+        memberships = PromoCollection.products.through.objects.values_list("promocollection__slug", "product_id")
+        for slug, product_id in memberships:
+            if product_id in positions:
+                bitsets["promo"][slug] = bitsets["promo"].get(slug, 0) | (1 << positions[product_id])
+        return cls(ids, bitsets, brand_names, price_ranges)
+
+    @staticmethod
+    def _union(bitset, values):
+        union = 0
+        for value in values:
+            union |= bitset.get(value, 0)
+        return union
+
+    def _price_union(self, labels):
+        union = 0
+        for label in labels:
+            bitset = self.bitsets["price"].get(label)
+            if bitset is None:
+                # A range from an older histogram (a bookmarked link) still
+                # resolves to the buckets it names.
+                bitset = self._union(self.bitsets["price_bucket"], buckets_for(label))
+            union |= bitset
+        return union
+
+    def match(self, selections, mask=None):
+        """AND across facets, OR within a facet; empty selections are ignored."""
+        mask = self.all if mask is None else mask
+        for facet, values in selections.items():
+            if not values:
+                continue
+            if facet == "price":
+                mask &= self._price_union(values)
+            else:
+                mask &= self._union(self.bitsets.get(facet, {}), values)
+            if not mask:
+                break
+        return mask
+
+    def facet_counts(self, base_mask, selections):
+        """Per-option counts for every sidebar facet in one pass over the bitsets.
+
+        Options are those present in ``base_mask``; each facet's counts apply the
+        selections on all *other* facets, so ticking a shape narrows the colour
+        counts but leaves the other shapes selectable with their own totals.
+        """
+        counts = {}
+        for facet in FILTER_FACETS:
+            others = {key: values for key, values in selections.items() if key != facet}
+            mask = self.match(others, mask=base_mask)
+            counts[facet] = {
+                value: (bitset & mask).bit_count()
+                for value, bitset in self.bitsets.get(facet, {}).items()
+                if bitset & base_mask
+            }
+        return counts
+
+    def ids_for(self, mask):
+        bits = format(mask, "b")[::-1] if mask else ""
+        ids = self.ids
+        return [ids[position] for position, bit in enumerate(bits) if bit == "1"]
+
+
+@versioned()
+def get_facet_index():
+    return FacetIndex.build()
+
+
+class ProductIdList:
+    """Sequence of product ids that only hits the database for the slice asked for.
+
+    ``ids`` are ascending unless ``ranked``, in which case their order is
+    meaningful (search relevance) and must be kept.
+    """
+
+    def __init__(self, ids, queryset=None, ranked=False):
+        self.ids = ids
+        self.queryset = queryset if queryset is not None else Product.objects.select_related("brand")
+        self.ranked = ranked
+        self._positions = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.hydrate(self.ids[index])
+        return self.hydrate([self.ids[index]])[0]
+
+    def position(self, product_id, after=False):
+        """Index of ``product_id`` (just past it with ``after``), as ``bisect`` would give.
+
+        A ranked list has no order to bisect on; an id that has dropped out of
+        it (the catalog changed under a cursor) restarts from the top.
+        """
+        if not self.ranked:
+            return (bisect_right if after else bisect_left)(self.ids, product_id)
+        if self._positions is None:
+            self._positions = {value: position for position, value in enumerate(self.ids)}
+        position = self._positions.get(product_id)
+        if position is None:
+            return 0
+        return position + 1 if after else position
+
+    def hydrate(self, ids):
+        products = {product.id: product for product in self.queryset.filter(id__in=ids)}
+        return [products[product_id] for product_id in ids if product_id in products]
@@ -0,0 +1,165 @@
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from dataclasses import dataclass
+from functools import lru_cache
+from urllib.parse import urlencode
+from weakref import WeakKeyDictionary
+
+from django.db.models import Q
+
+from .facet_index import FACET_FIELDS, FILTER_FACETS, get_facet_index
+from .models import Product
+from .price_buckets import buckets_for
+
+# Compiled listings kept per facet index (i.e. per catalog version).
+PLAN_CACHE_SIZE = 512
+
+# Values beyond this many per facet are dropped; no sidebar offers more.
+MAX_FACET_VALUES = 20
+
+# Facets whose values come from a fixed choice set on Product.
+CHOICE_FACETS = {
+    "shape": frozenset(value for value, _ in Product.SHAPE_CHOICES),
+    "frame_type": frozenset(value for value, _ in Product.FRAME_TYPE_CHOICES),
+    "gender": frozenset(value for value, _ in Product.GENDER_CHOICES),
+    "size": frozenset(value for value, _ in Product.SIZE_CHOICES),
+    "weight_group": frozenset(value for value, _ in Product.WEIGHT_CHOICES),
+}
+
+SLUG_RE = re.compile(r"^[-\w]+$", re.ASCII)
+
+# material and color are free text on Product; anything longer can't match.
+FREE_TEXT_MAX_LENGTH = 50
+
+
+def is_valid(facet, value):
+    """Whether ``value`` can be a value of ``facet`` at all."""
+    if facet in CHOICE_FACETS:
+        return value in CHOICE_FACETS[facet]
+    if facet == "price":
+        return bool(buckets_for(value))
+    if facet == "brand":
+        return bool(SLUG_RE.match(value))
+    return 0 < len(value) <= FREE_TEXT_MAX_LENGTH
+
+
+def _normalize(values):
+    return tuple(sorted(set(values)))[:MAX_FACET_VALUES]
+
+
+@dataclass(frozen=True)
+class FilterSpec:
+    """A listing filter parsed once from the query string: validated, normalized and hashable.
+
+    ``base`` scopes the listing (a category, a brand page, a promo) and
+    ``selections`` are the sidebar facets ticked on top of it; both are
+    ``((facet, values), ...)`` with ``values`` sorted and deduplicated.
+    ``pinned`` facets are fixed by the URL rather than the query string.
+    """
+
+    base: tuple = ()
+    selections: tuple = ()
+    pinned: tuple = ()
+
+    @classmethod
+    def from_query(cls, params, base=None, pinned=()):
+        """Parse the ``FILTER_FACETS`` of ``params``, dropping values that can't match.
+
+        A ``pinned`` facet shows its ``base`` values as selected, whatever the
+        query string says.
+        """
+        base = {facet: _normalize(values) for facet, values in (base or {}).items()}
+        selections = []
+        for facet in FILTER_FACETS:
+            if facet in pinned:
+                values = base.get(facet, ())
+            else:
+                values = _normalize(value for value in params.getlist(facet) if is_valid(facet, value))
+            if values:
+                selections.append((facet, values))
+        return cls(tuple(sorted(base.items())), tuple(selections), tuple(sorted(pinned)))
+
+    def selected(self, facet):
+        return dict(self.selections).get(facet, ())
+
+    @property
+    def query_string(self):
+        """The selections as a canonical query string, pinned facets left to the URL."""
+        return urlencode(
+            [(facet, value) for facet, values in self.selections if facet not in self.pinned for value in values]
+        )
+
+    def as_q(self):
+        """The spec as a ``Q`` over Product, for querysets that can't use the facet index."""
+        return _compile_q(self.base + self.selections)
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _compile_q(facets):
+    q = Q()
+    for facet, values in facets:
+        if facet == "price":
+            q &= Q(price_bucket__in=sorted({bucket for label in values for bucket in buckets_for(label)}))
+        else:
+            q &= Q(**{f"{FACET_FIELDS[facet]}__in": values})
+    return q
+
+
+# ``ids`` match the spec; ``choices`` are the sidebar's counted options.
+ListingPlan = namedtuple("ListingPlan", "ids choices")
+
+
+def _counted_choices(choices, counts):
+    return [(value, label, counts[value]) for value, label in choices if value in counts]
+
+
+def _sidebar_choices(index, counts):
+    return {
+        "brands": sorted(
+            (
+                {"slug": slug, "name": index.brand_names[slug], "count": count}
+                for slug, count in counts["brand"].items()
+                if slug in index.brand_names
+            ),
+            key=lambda brand: brand["name"],
+        ),
+        "shape_choices": _counted_choices(Product.SHAPE_CHOICES, counts["shape"]),
+        "frame_type_choices": _counted_choices(Product.FRAME_TYPE_CHOICES, counts["frame_type"]),
+        "gender_choices": _counted_choices(Product.GENDER_CHOICES, counts["gender"]),
+        "material_choices": sorted((value, count) for value, count in counts["material"].items() if value),
+        "color_choices": sorted((value, count) for value, count in counts["color"].items() if value),
+        "size_choices": _counted_choices(Product.SIZE_CHOICES, counts["size"]),
+        "weight_choices": _counted_choices(Product.WEIGHT_CHOICES, counts["weight_group"]),
+        "price_choices": [
+            (price_range.label, price_range.min_price, price_range.max_price, counts["price"].get(price_range.label, 0))
+            for price_range in index.price_ranges
+        ],
+    }
+
+
+_plans = WeakKeyDictionary()
+_plans_lock = threading.Lock()
+
+
+def compile_listing(spec):
+    """The ``ListingPlan`` for ``spec``, memoized until the facet index is rebuilt."""
+    index = get_facet_index()
+    with _plans_lock:
+        plans = _plans.setdefault(index, OrderedDict())
+        plan = plans.get(spec)
+        if plan is not None:
+            plans.move_to_end(spec)
+            return plan
+
+    base_mask = index.match(dict(spec.base, is_active=(True,)))
+    selections = dict(spec.selections)
+    plan = ListingPlan(
+        index.ids_for(index.match(selections, mask=base_mask)),
+        _sidebar_choices(index, index.facet_counts(base_mask, selections)),
+    )
+    with _plans_lock:
+        plans[spec] = plan
+        if len(plans) > PLAN_CACHE_SIZE:
+            plans.popitem(last=False)
+    return plan
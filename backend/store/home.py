@@ -0,0 +1,67 @@
+from dataclasses import dataclass, fields
+
+from .catalog import BANNERS, CATALOG, versioned
+from .models import Banner, BrandSummary, Category, Product
+
+HOME_SNAPSHOT_TTL = 300
+
+
+def _first(banners, banner_type):
+    return next((banner for banner in banners if banner.banner_type == banner_type), None)
+
+
+@dataclass(frozen=True)
+class HomeSnapshot:
+    """Everything home.html renders, fully loaded so templates issue no queries."""
+
+    banners: tuple
+    categories: tuple
+    trending_products: tuple
+    premium_products: tuple
+    exclusive_products: tuple
+    brand_cards: tuple
+    special_banners: tuple
+    exclusive_banner: Banner | None
+    exclusive_banners: tuple
+    premium_banner: Banner | None
+    fossil_products: tuple
+
+    @classmethod
+    def build(cls):
+        active_banners = list(Banner.objects.filter(active=True).order_by('order'))
+        products = Product.objects.filter(is_active=True).select_related('brand').order_by('-created_at')
+
+        special_banners = (
+            _first(active_banners, 'coupon'),
+            _first(active_banners, 'replacement'),
+            _first(active_banners, 'buy1get1'),
+        )
+        fossil_products = tuple(products.filter(brand__slug='fossil')[:8]) or tuple(products[:8])
+
+        return cls(
+            banners=tuple(banner for banner in active_banners if banner.banner_type == 'hero')[:5],
+            categories=tuple(Category.objects.filter(active=True)),
+            trending_products=tuple(products.filter(is_trending=True)[:12]),
+            premium_products=tuple(products.filter(is_premium=True)[:12]),
+            exclusive_products=tuple(products.filter(is_exclusive=True)[:12]),
+            brand_cards=tuple(
+                BrandSummary.objects.filter(brand__active=True, product_count__gt=0)
+                .select_related('brand')
+                .order_by('brand_id')
+            ),
+            special_banners=tuple(banner for banner in special_banners if banner),
+            exclusive_banner=_first(active_banners, 'exclusive'),
+            exclusive_banners=tuple(banner for banner in active_banners if banner.banner_type == 'exclusive'),
+            premium_banner=_first(active_banners, 'premium'),
+            fossil_products=fossil_products,
+        )
+
+    def as_context(self):
+        context = {field.name: getattr(self, field.name) for field in fields(self)}
+        context['shape_choices'] = Product.SHAPE_CHOICES
+        return context
+
+
+@versioned(CATALOG, BANNERS, ttl=HOME_SNAPSHOT_TTL)
+def get_home_snapshot():
+    return HomeSnapshot.build()
@@ -0,0 +1,63 @@
+from functools import partial
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .catalog import get_version
+from .pagination import CURSOR_PARAMS
+
+LISTING_CACHE_TIMEOUT = 600
+
+# Query string keys besides the filter facets that change what a listing
+# renders; anything else (tracking params, etc.) must not fragment the cache.
+LISTING_PARAMS = ("category", "tryon")
+
+
+def canonical_query(params, keys=LISTING_PARAMS):
+    """Query string of ``keys`` only, each list sorted and deduplicated."""
+    return urlencode([(key, value) for key in keys for value in sorted(set(params.getlist(key)))])
+
+
+def listing_cache_context(name, spec, params):
+    """Template variables the ``{% cache %}`` fragments of a listing page vary on.
+
+    The catalog version is part of the key, so any catalog write makes every
+    older fragment unreachable without purging anything. Filters come from the
+    normalized ``spec``, so values that can't match don't fragment it either.
+    """
+    filter_query = "&".join(query for query in (spec.query_string, canonical_query(params)) if query)
+    return {
+        "listing_cache_timeout": LISTING_CACHE_TIMEOUT,
+        "listing_key": f"{name}:{get_version()}:{filter_query}",
+        "listing_page_key": canonical_query(params, CURSOR_PARAMS),
+        "filter_query": filter_query,
+    }
+
+
+def lazy_context(build, keys):
+    """Context whose values come from one ``build()`` call, made on first access.
+
+    When every fragment using them is served from the cache, ``build`` never
+    runs and the page costs no queries.
+    """
+    result = {}
+
+    def value(key):
+        if not result:
+            result.update(build())
+        return result[key]
+
+    return {key: SimpleLazyObject(partial(value, key)) for key in keys}
+
+
+def cached_lookup(model, **filters):
+    """``model.objects.filter(**filters).first()`` cached for the current catalog version."""
+    key = "store:lookup:{}:{}:{}".format(
+        get_version(), model._meta.label_lower, urlencode(sorted(filters.items()))
+    )
+    instance = cache.get(key)
+    if instance is None:
+        instance = model.objects.filter(**filters).first() or False
+        cache.set(key, instance, LISTING_CACHE_TIMEOUT)
+    return instance or None
@@ -0,0 +1,94 @@
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.brand_summaries import refresh_brand_summaries
+from store.catalog import BANNERS, CATALOG, bump_version
+from store.models import Product
+from store.rendition_queue import BATCH_SIZE, enqueue_renditions, rendition_pool
+from store.renditions import IMAGE_FIELDS, hash_file
+from store.storage import content_storage, digest_from_name, hashed_name
+
+
+class Command(BaseCommand):
+    help = "Move catalog images stored by filename to content-addressed storage, storing duplicates once."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=os.cpu_count() or 1, help="Hashing processes (default: one per core)."
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be moved without moving it.")
+        parser.add_argument("--keep-originals", action="store_true", help="Leave the old files in place.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        names = set()
+        for model, field, _ in IMAGE_FIELDS:
+            rows = model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True})
+            names.update(name for name in rows.values_list(field, flat=True).distinct() if not digest_from_name(name))
+        names = sorted(names)
+        with rendition_pool(options["processes"]) as pool:
+            digests = dict(zip(names, pool.map(hash_file, names, chunksize=64)))
+
+        moved = {name: hashed_name(digest, name) for name, digest in digests.items() if digest}
+        unreadable = len(names) - len(moved)
+        targets = set(moved.values())
+        total_bytes = sum(default_storage.size(name) for name in moved)
+        sources = {target: name for name, target in moved.items()}
+        stored_bytes = sum(default_storage.size(name) for name in sources.values())
+        self.stdout.write(
+            f"{len(moved)} files ({total_bytes} bytes) hold {len(targets)} distinct images ({stored_bytes} bytes); "
+            f"{unreadable} missing or unreadable."
+        )
+        if options["dry_run"]:
+            return
+
+        for name, target in moved.items():
+            if not content_storage.exists(target):
+                with default_storage.open(name, "rb") as file:
+                    content_storage.save(name, file)
+
+        with transaction.atomic():
+            for model, field, hash_field in IMAGE_FIELDS:
+                updates = []
+                for start in range(0, len(names), BATCH_SIZE):
+                    rows = model.objects.filter(**{f"{field}__in": names[start : start + BATCH_SIZE]})
+                    updates.extend(
+                        model(pk=pk, **{field: moved[name], hash_field: digest_from_name(moved[name])})
+                        for pk, name in rows.values_list("pk", field)
+                        if name in moved
+                    )
+                model.objects.bulk_update(updates, [field, hash_field], batch_size=BATCH_SIZE)
+                self.stdout.write(f"Repointed {len(updates)} {model.__name__} rows.")
+            self.repoint_product_cards(moved)
+            refresh_brand_summaries()
+            bump_version(CATALOG, BANNERS)
+        enqueue_renditions(digest_from_name(target) for target in targets)
+
+        if not options["keep_originals"]:
+            for name in moved:
+                default_storage.delete(name)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deduplicated {len(moved)} files into {len(targets)} in {time.monotonic() - started:.1f}s; "
+                f"saved {total_bytes - stored_bytes} bytes."
+            )
+        )
+
+    def repoint_product_cards(self, moved):
+        # Card columns are copies of image names, so they move with them.
+        updates = []
+        columns = ("primary_image", "primary_image_hash", "secondary_image", "secondary_image_hash")
+        for product_id, *values in Product.objects.values_list("pk", *columns):
+            product = Product(pk=product_id, **dict(zip(columns, values)))
+            for prefix in ("primary_image", "secondary_image"):
+                target = moved.get(getattr(product, prefix))
+                if target:
+                    setattr(product, prefix, target)
+                    setattr(product, f"{prefix}_hash", digest_from_name(target))
+            if product.primary_image != values[0] or product.secondary_image != values[2]:
+                updates.append(product)
+        Product.objects.bulk_update(updates, columns, batch_size=BATCH_SIZE)
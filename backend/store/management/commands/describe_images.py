@@ -0,0 +1,24 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.rendition_queue import describe_all_images, rendition_pool
+
+
+class Command(BaseCommand):
+    help = "Store the hash, dimensions, dominant colour and placeholder of catalog images that lack them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=os.cpu_count() or 1, help="Reading processes (default: one per core)."
+        )
+        parser.add_argument("--all", action="store_true", help="Re-read images already described too.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with rendition_pool(max(1, options["processes"])) as pool:
+            described = describe_all_images(pool, redescribe=options["all"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Described {described} images in {time.monotonic() - started:.1f}s.")
+        )
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from accounts.models import OTPCode
+from cart.models import CheckoutAddress, CheckoutOrder
+from store.models import Product, PromoCollection
+from store.query_plans import explain_queryset, full_scans
+
+
+def _hot_queries():
+    """The query shapes behind the busiest pages, with placeholder values."""
+    active = Product.objects.filter(is_active=True)
+    return [
+        ("home: newest", active.order_by("-created_at")[:8]),
+        ("home: trending", active.filter(is_trending=True).order_by("-created_at")[:12]),
+        ("home: premium", active.filter(is_premium=True).order_by("-created_at")[:12]),
+        ("home: exclusive", active.filter(is_exclusive=True).order_by("-created_at")[:12]),
+        ("listing: category", active.filter(category_id=1, id__gt=0).order_by("id")[:13]),
+        ("listing: brand", active.filter(brand_id=1, id__gt=0).order_by("id")[:13]),
+        ("listing: shape/gender", active.filter(shape="round", gender="men").order_by("id")[:13]),
+        ("listing: price", active.filter(price_bucket__in=[4, 5]).order_by("id")[:13]),
+        ("listing: promo", PromoCollection.products.through.objects.filter(promocollection_id=1)),
+        ("product detail", active.filter(slug="product-1")),
+        ("cart", active.filter(slug__in=["product-1", "product-2"]).select_related("brand")),
+        ("checkout: addresses", CheckoutAddress.objects.filter(session_key="session")),
+        ("checkout: user addresses", CheckoutAddress.objects.filter(user_id=1)),
+        ("orders", CheckoutOrder.objects.filter(session_key="session").order_by("-created_at")),
+        ("orders: user", CheckoutOrder.objects.filter(user_id=1).order_by("-created_at")),
+        (
+            "otp verify",
+            OTPCode.objects.filter(identifier="+919999999999", channel="phone", verified=False).order_by(
+                "-created_at"
+            )[:1],
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Report which hot storefront, checkout and login queries SQLite still plans as a full table scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--plans", action="store_true", help="Print the full plan of every query.")
+        parser.add_argument("--strict", action="store_true", help="Exit with an error if any query scans.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("EXPLAIN QUERY PLAN output is only understood for SQLite.")
+
+        queries = _hot_queries()
+        scanning = []
+        for name, queryset in queries:
+            plan = explain_queryset(queryset)
+            scans = full_scans(plan)
+            if scans:
+                scanning.append(name)
+                self.stdout.write(self.style.WARNING(f"SCAN  {name}: {', '.join(sorted(scans))}"))
+            else:
+                self.stdout.write(f"ok    {name}")
+            if options["plans"]:
+                for line in plan:
+                    self.stdout.write(f"        {line}")
+
+        if scanning and options["strict"]:
+            raise CommandError(f"{len(scanning)} hot queries scan a whole table.")
+        self.stdout.write(self.style.SUCCESS(f"{len(scanning)} of {len(queries)} hot queries scan."))
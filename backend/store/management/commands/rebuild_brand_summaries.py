@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from store.brand_summaries import refresh_brand_summaries
+from store.models import BrandSummary
+
+
+class Command(BaseCommand):
+    help = "Recompute every brand's product count, minimum price and card image."
+
+    def handle(self, *args, **options):
+        refresh_brand_summaries()
+        stocked = BrandSummary.objects.filter(product_count__gt=0).count()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {BrandSummary.objects.count()} brand summaries ({stocked} stocked)."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from store.search import fts
+
+
+class Command(BaseCommand):
+    help = "Recreate the SQLite FTS5 product search table and its triggers from scratch."
+
+    def handle(self, *args, **options):
+        if not fts.fts5_available():
+            raise CommandError("The default database is not SQLite with FTS5 support.")
+        with transaction.atomic():
+            fts.rebuild()
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {fts.FTS_TABLE}")
+            (count,) = cursor.fetchone()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models import PromoCollection
+from store.promos import refresh_collections
+
+
+class Command(BaseCommand):
+    help = "Recompute promo collection membership from each collection's keyword rule."
+
+    def add_arguments(self, parser):
+        parser.add_argument("slugs", nargs="*", help="Collections to refresh (default: all).")
+
+    def handle(self, *args, **options):
+        collections = PromoCollection.objects.all()
+        if options["slugs"]:
+            collections = collections.filter(slug__in=options["slugs"])
+            missing = set(options["slugs"]) - set(collections.values_list("slug", flat=True))
+            if missing:
+                raise CommandError(f"Unknown promo collections: {', '.join(sorted(missing))}")
+        collections = list(collections)
+        refresh_collections(collections)
+        for collection in collections:
+            self.stdout.write(f"{collection.slug}: {collection.products.count()} products")
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {len(collections)} promo collections."))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.models import SimilarProduct
+from store.recommendations import refresh_similar_products
+
+
+class Command(BaseCommand):
+    help = 'Recompute the "similar frames" of products that changed since the last run.'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Recompute every product's neighbours.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rewritten = refresh_similar_products(full=options["full"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rewrote the neighbours of {rewritten} products in {time.monotonic() - started:.1f}s "
+                f"({SimilarProduct.objects.count()} links stored)."
+            )
+        )
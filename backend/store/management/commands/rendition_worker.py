@@ -0,0 +1,43 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.rendition_queue import queue_all_images, rendition_pool, run_worker
+
+
+class Command(BaseCommand):
+    help = "Render queued thumbnail and WebP renditions of catalog images on a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=os.cpu_count() or 1, help="Worker processes (default: one per core)."
+        )
+        parser.add_argument("--once", action="store_true", help="Exit once no job is ready instead of polling.")
+        parser.add_argument(
+            "--regenerate", action="store_true", help="First describe every catalog image and queue all of them."
+        )
+        parser.add_argument(
+            "--redescribe", action="store_true", help="With --regenerate, re-read images already described too."
+        )
+
+    def handle(self, *args, **options):
+        processes = max(1, options["processes"])
+        started = time.monotonic()
+        with rendition_pool(processes) as pool:
+            if options["regenerate"]:
+                described, queued = queue_all_images(pool, redescribe=options["redescribe"])
+                self.stdout.write(f"Described {described} images and queued {queued} jobs.")
+            stats = run_worker(pool, processes, once=options["once"], progress=self.report(started))
+        self.report(started)(stats)
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def report(self, started):
+        def progress(stats):
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{stats['done']} done, {stats['retried']} to retry, {stats['failed']} failed "
+                f"in {elapsed:.1f}s ({sum(stats.values()) / max(elapsed, 0.001):.1f} jobs/s)."
+            )
+
+        return progress
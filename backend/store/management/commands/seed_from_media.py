@@ -1,11 +1,24 @@
-import random
+import os
+import time
 from pathlib import Path
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.text import slugify
 
-from store.models import Banner, Brand, Category, Product, ProductImage
+from store.brand_summaries import refresh_brand_summaries
+from store.catalog import BANNERS, CATALOG, bump_version
+from store.models import Banner, Brand, BrandSummary, Category, Product, ProductImage, PromoCollection, SimilarProduct
+from store.promos import refresh_collections
+from store.rendition_queue import BATCH_SIZE, queue_all_images, rendition_pool
+from store.renditions import sync_card_details
+
+# Rows written between progress lines.
+PROGRESS_EVERY = 10_000
 
 
 class Command(BaseCommand):
@@ -17,20 +30,21 @@ class Command(BaseCommand):
             action="store_true",
             help="Clear existing products, images, categories, brands, and banners.",
         )
+        parser.add_argument(
+            "--processes", type=int, default=os.cpu_count() or 1, help="Reading processes (default: one per core)."
+        )
 
     def handle(self, *args, **options):
-        if options["clear"]:
-            ProductImage.objects.all().delete()
-            Product.objects.all().delete()
-            Banner.objects.all().delete()
-            Category.objects.all().delete()
-            Brand.objects.all().delete()
-
+        started = time.monotonic()
         media = Path(settings.BASE_DIR) / "media"
-        products_dir = media / "products"
-        categories_dir = media / "categories"
-        brands_dir = media / "brands"
-        banners_dir = media / "banners"
+        product_images = self.scan(media / "products")
+        cat_images = self.scan(media / "categories")
+        brand_images = self.scan(media / "brands")
+        banner_images = self.scan(media / "banners")
+        self.stdout.write(
+            f"Found {len(product_images)} product, {len(cat_images)} category, {len(brand_images)} brand "
+            f"and {len(banner_images)} banner images in {time.monotonic() - started:.1f}s."
+        )
 
         categories = [
             ("Eyeglasses", "eyeglasses"),
@@ -55,85 +69,175 @@ class Command(BaseCommand):
         sizes = ["extra-narrow", "narrow", "medium", "wide", "extra-wide"]
         weights = ["light", "average", "heavy"]
 
-        cat_images = sorted([p for p in categories_dir.glob("*") if p.is_file()])
-        brand_images = sorted([p for p in brands_dir.glob("*") if p.is_file()])
-
-        for index, (name, slug) in enumerate(categories):
-            image_path = None
-            if cat_images:
-                image_path = f"categories/{cat_images[index % len(cat_images)].name}"
-            Category.objects.get_or_create(
-                slug=slug,
-                defaults={
-                    "name": name,
-                    "image": image_path,
-                    "active": True,
-                },
+        # Rows are only ever added, never changed, so reruns keep what is there.
+        with transaction.atomic():
+            if options["clear"]:
+                self.clear()
+
+            existing = set(Category.objects.values_list("slug", flat=True))
+            self.create(
+                Category,
+                (
+                    Category(
+                        slug=slug,
+                        name=name,
+                        image=f"categories/{cat_images[index % len(cat_images)]}" if cat_images else None,
+                        active=True,
+                    )
+                    for index, (name, slug) in enumerate(categories)
+                    if slug not in existing
+                ),
             )
 
-        for index, name in enumerate(brands):
-            image_path = None
-            if brand_images:
-                image_path = f"brands/{brand_images[index % len(brand_images)].name}"
-            Brand.objects.get_or_create(
-                slug=slugify(name),
-                defaults={"name": name, "logo": image_path, "active": True},
+            existing = set(Brand.objects.values_list("slug", flat=True))
+            self.create(
+                Brand,
+                (
+                    Brand(
+                        slug=slugify(name),
+                        name=name,
+                        logo=f"brands/{brand_images[index % len(brand_images)]}" if brand_images else None,
+                        active=True,
+                    )
+                    for index, name in enumerate(brands)
+                    if slugify(name) not in existing
+                ),
             )
 
-        banner_images = sorted([p for p in banners_dir.glob("*") if p.is_file()])
-        for index, banner in enumerate(banner_images[:6]):
-            Banner.objects.get_or_create(
-                title=f"Hero {index + 1}",
-                banner_type="hero",
-                defaults={
-                    "image": f"banners/{banner.name}",
-                    "active": True,
-                    "order": index,
-                },
+            existing = set(Banner.objects.filter(banner_type="hero").values_list("title", flat=True))
+            self.create(
+                Banner,
+                (
+                    Banner(
+                        title=f"Hero {index + 1}",
+                        banner_type="hero",
+                        image=f"banners/{banner}",
+                        active=True,
+                        order=index,
+                    )
+                    for index, banner in enumerate(banner_images[:6])
+                    if f"Hero {index + 1}" not in existing
+                ),
             )
 
-        product_files = sorted([p for p in products_dir.glob("*") if p.is_file()])
-        if not product_files:
-            self.stdout.write(self.style.WARNING("No product images found."))
-            return
-
-        category_objs = list(Category.objects.all())
-        brand_objs = list(Brand.objects.all())
-
-        for i, image in enumerate(product_files):
-            category = category_objs[i % len(category_objs)]
-            brand = brand_objs[i % len(brand_objs)]
-            slug = f"product-{i + 1}"
-            name = f"Product {i + 1}"
-            price = 999 + (i % 10) * 150
-
-            product, _ = Product.objects.get_or_create(
-                slug=slug,
-                defaults={
-                    "category": category,
-                    "brand": brand,
-                    "name": name,
-                    "description": "Auto-seeded product from media.",
-                    "gender": genders[i % len(genders)],
-                    "shape": shapes[i % len(shapes)],
-                    "frame_type": frame_types[i % len(frame_types)],
-                    "frame_material": "Acetate",
-                    "color": colors[i % len(colors)],
-                    "size": sizes[i % len(sizes)],
-                    "weight_group": weights[i % len(weights)],
-                    "base_price": price,
-                    "is_prescription_supported": True,
-                    "is_active": True,
-                    "is_trending": i % 8 == 0,
-                    "is_premium": i % 10 == 0,
-                    "is_exclusive": i % 12 == 0,
-                },
+            if product_images:
+                category_ids = list(Category.objects.values_list("pk", flat=True))
+                brand_ids = list(Brand.objects.values_list("pk", flat=True))
+                existing = set(Product.objects.values_list("slug", flat=True))
+                self.create(
+                    Product,
+                    (
+                        Product(
+                            slug=f"product-{i + 1}",
+                            category_id=category_ids[i % len(category_ids)],
+                            brand_id=brand_ids[i % len(brand_ids)],
+                            name=f"Product {i + 1}",
+                            description="Auto-seeded product from media.",
+                            gender=genders[i % len(genders)],
+                            shape=shapes[i % len(shapes)],
+                            frame_type=frame_types[i % len(frame_types)],
+                            frame_material="Acetate",
+                            color=colors[i % len(colors)],
+                            size=sizes[i % len(sizes)],
+                            weight_group=weights[i % len(weights)],
+                            base_price=999 + (i % 10) * 150,
+                            is_prescription_supported=True,
+                            is_active=True,
+                            is_trending=i % 8 == 0,
+                            is_premium=i % 10 == 0,
+                            is_exclusive=i % 12 == 0,
+                        )
+                        for i in range(len(product_images))
+                        if f"product-{i + 1}" not in existing
+                    ),
+                )
+
+                product_ids = dict(Product.objects.values_list("slug", "pk"))
+                existing = set(ProductImage.objects.values_list("product_id", "image"))
+                new_images = [
+                    ProductImage(product_id=product_ids[f"product-{i + 1}"], image=f"products/{image}", is_primary=True)
+                    for i, image in enumerate(product_images)
+                    if (product_ids[f"product-{i + 1}"], f"products/{image}") not in existing
+                ]
+                self.create(ProductImage, new_images)
+                self.sync_cards(sorted({image.product_id for image in new_images}))
+            else:
+                self.stdout.write(self.style.WARNING("No product images found."))
+
+            # bulk_create skips post_save, so what the signals keep in step is refreshed here.
+            refresh_collections()
+            refresh_brand_summaries()
+            bump_version(CATALOG, BANNERS)
+
+        reading = time.monotonic()
+        with rendition_pool(max(1, options["processes"])) as pool:
+            described, queued = queue_all_images(pool, force=False)
+        self.stdout.write(
+            f"Described {described} images in {time.monotonic() - reading:.1f}s and queued {queued} rendition jobs."
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {len(product_images)} products from media in {time.monotonic() - started:.1f}s."
             )
+        )
 
-            ProductImage.objects.get_or_create(
-                product=product,
-                image=f"products/{image.name}",
-                defaults={"is_primary": True},
-            )
+    def clear(self):
+        """Empty the seeded tables with one DELETE each, referencing tables first.
+
+        Per-row delete signals are skipped: what they keep in step is refreshed
+        once the seed is written, and media left unreferenced is prune_media's.
+        """
+        for model in (
+            PromoCollection.products.through,
+            SimilarProduct,
+            ProductImage,
+            Product,
+            BrandSummary,
+            Banner,
+            Category,
+            Brand,
+        ):
+            model._base_manager.all()._raw_delete(model._base_manager.db)
+
+    def scan(self, directory):
+        """Sorted names of the files in ``directory``, read in one pass; dotfiles are skipped, as glob() does."""
+        try:
+            with os.scandir(directory) as entries:
+                return sorted(entry.name for entry in entries if entry.is_file() and not entry.name.startswith("."))
+        except FileNotFoundError:
+            return []
+
+    def create(self, model, objects):
+        """``bulk_create`` ``objects`` in batches, reporting progress and throughput."""
+        started = time.monotonic()
+        created = 0
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == BATCH_SIZE:
+                model.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+                if created % PROGRESS_EVERY == 0:
+                    self.report(model, created, started)
+        model.objects.bulk_create(batch)
+        self.report(model, created + len(batch), started)
+
+    def report(self, model, count, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"Created {count} {model._meta.verbose_name_plural} in {elapsed:.1f}s "
+            f"({count / max(elapsed, 0.001):.0f} rows/s)."
+        )
 
-        self.stdout.write(self.style.SUCCESS(f"Seeded {len(product_files)} products from media."))
+    def sync_cards(self, product_ids):
+        """``sync_card_images`` for many products, two queries per batch of them."""
+        images = ProductImage.objects.filter(product_id=OuterRef("pk")).order_by("-is_primary", "id").values("image")
+        for start in range(0, len(product_ids), BATCH_SIZE):
+            batch = product_ids[start : start + BATCH_SIZE]
+            Product.objects.filter(pk__in=batch).update(
+                primary_image=Coalesce(Subquery(images[:1]), Value("")),
+                secondary_image=Coalesce(Subquery(images[1:2]), Value("")),
+                updated_at=timezone.now(),
+            )
+            sync_card_details(batch)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from store.catalog import bump_version
+from store.models import Product, sync_card_images
+
+
+class Command(BaseCommand):
+    help = "Copy primary/secondary ProductImage paths and dimensions onto Product card columns."
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+        for index, product_id in enumerate(product_ids, start=1):
+            sync_card_images(product_id)
+            if index % 500 == 0:
+                self.stdout.write(f"Synced {index}/{len(product_ids)} products...")
+        bump_version()
+        self.stdout.write(self.style.SUCCESS(f"Synced card images for {len(product_ids)} products."))
@@ -0,0 +1,136 @@
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .renditions import RENDITION_DIR
+from .storage import ORIGINALS_DIR
+
+# Files under these directories are named by content hash and never change.
+HASHED_DIRS = (f"{ORIGINALS_DIR}/", f"{RENDITION_DIR}/")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def cache_control(name):
+    if name.startswith(HASHED_DIRS):
+        return IMMUTABLE_CACHE_CONTROL
+    return f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+
+
+def byte_range(header, size):
+    """``(start, end)``, inclusive, requested by a ``Range`` header for a ``size``-byte file.
+
+    ``None`` means the header is to be ignored and the whole file sent: it
+    is malformed or asks for several ranges, which no image client needs.
+    ``False`` means the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        # A suffix range: the last ``last`` bytes.
+        length = int(last)
+        return (max(0, size - length), size - 1) if length and size else False
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def _stream(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _delegate(name, path, content_type):
+    # The front proxy sends the file, handling ranges itself.
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SENDFILE == "x-accel-redirect":
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(name)
+    else:
+        response["X-Sendfile"] = path
+    return response
+
+
+def _serve(request, path, size, etag, last_modified, content_type):
+    requested = None
+    if "Range" in request.headers:
+        # A stale If-Range means the client's partial copy is of an older file.
+        if_range = request.headers.get("If-Range")
+        if if_range is None or if_range in (etag, http_date(last_modified)):
+            requested = byte_range(request.headers["Range"], size)
+    if requested is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if request.method == "HEAD":
+        response = HttpResponse(content_type=content_type)
+        response["Content-Length"] = size
+    elif requested is None:
+        # Whole files go through wsgi.file_wrapper, which servers can sendfile().
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    else:
+        start, end = requested
+        response = StreamingHttpResponse(_stream(open(path, "rb"), start, end - start + 1), status=206)
+        response["Content-Type"] = content_type
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def serve_media(request, name):
+    """Response serving the file ``name`` under MEDIA_ROOT, or ``None`` if there's no such file.
+
+    Answers revalidations with a 304 and ``Range`` requests with a 206, and
+    hands the file itself to the front proxy when MEDIA_SENDFILE says how.
+    """
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+        info = os.stat(path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        return None
+    if not stat.S_ISREG(info.st_mode):
+        return None
+
+    etag = f'"{info.st_mtime_ns:x}-{info.st_size:x}"'
+    last_modified = int(info.st_mtime)
+    headers = {"ETag": etag, "Last-Modified": http_date(last_modified), "Cache-Control": cache_control(name)}
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified[header] = value
+        return not_modified
+
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if settings.MEDIA_SENDFILE:
+        response = _delegate(name, path, content_type)
+    else:
+        response = _serve(request, path, info.st_size, etag, last_modified, content_type)
+    for header, value in headers.items():
+        response[header] = value
+    return response
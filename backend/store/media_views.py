@@ -0,0 +1,38 @@
+from django.http import Http404
+from django.views.decorators.http import require_safe
+from PIL import Image
+
+from .media import serve_media
+from .renditions import DIGEST_RE, FORMATS, RENDITIONS, render_file, rendition_name, source_name
+
+
+@require_safe
+def media_view(request, path):
+    """Serve a file under MEDIA_ROOT, for when no front proxy or MediaFilesMiddleware does."""
+    response = serve_media(request, path)
+    if response is None:
+        raise Http404("No such file.")
+    return response
+
+
+@require_safe
+def rendition_view(request, prefix, digest, rendition, extension):
+    """Serve a rendition, rendering it first if rendition_worker hasn't yet or it was cleared out.
+
+    Normally the web server answers these from MEDIA_ROOT and only misses
+    reach Django.
+    """
+    if not DIGEST_RE.match(digest) or prefix != digest[:2] or rendition not in RENDITIONS or extension not in FORMATS:
+        raise Http404("No such rendition.")
+    name = rendition_name(digest, rendition, extension)
+    response = serve_media(request, name)
+    if response is None:
+        source = source_name(digest)
+        if source is None:
+            raise Http404("No such rendition.")
+        try:
+            render_file(source, digest)
+        except (OSError, Image.DecompressionBombError):
+            raise Http404("No such rendition.")
+        response = serve_media(request, name)
+    return response
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .media import serve_media
+
+
+class MediaFilesMiddleware:
+    """Serve MEDIA_URL ahead of sessions, CSRF and auth, when Django serves media at all.
+
+    Only files that exist are answered here; other media paths fall through
+    to the URLconf, where missing renditions get rendered.
+    """
+
+    def __init__(self, get_response):
+        if not (settings.DEBUG or settings.SERVE_MEDIA_FILES) or not settings.MEDIA_URL.startswith("/"):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.MEDIA_URL
+
+    def __call__(self, request):
+        if request.method in ("GET", "HEAD") and request.path_info.startswith(self.prefix):
+            response = serve_media(request, request.path_info[len(self.prefix) :])
+            if response is not None:
+                return response
+        return self.get_response(request)
@@ -0,0 +1,59 @@
+from django.db import migrations, models
+
+
+def backfill_card_images(apps, schema_editor):
+    Product = apps.get_model("store", "Product")
+    ProductImage = apps.get_model("store", "ProductImage")
+    images = {}
+    for product_id, name in ProductImage.objects.order_by("product_id", "-is_primary", "id").values_list(
+        "product_id", "image"
+    ):
+        images.setdefault(product_id, []).append(name)
+    products = []
+    for product in Product.objects.filter(id__in=images).only("id"):
+        names = images[product.id]
+        product.primary_image = names[0]
+        product.secondary_image = names[1] if len(names) > 1 else ""
+        products.append(product)
+    Product.objects.bulk_update(products, ["primary_image", "secondary_image"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0008_deliverypincode"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="primary_image",
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="primary_image_width",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="primary_image_height",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="secondary_image",
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="secondary_image_width",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="secondary_image_height",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_card_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+from store.search import fts
+
+
+def create_product_fts(apps, schema_editor):
+    # Only the fts5 search backend reads the table; skip it where SQLite was
+    # built without FTS5 (or on other databases) rather than fail the migration.
+    # Its triggers and contents are added after migrate (store.signals.rebuild_fts),
+    # so later table rebuilds in the same run aren't tripped up by them.
+    if fts.fts5_available(schema_editor.connection):
+        fts.create_table(schema_editor.connection)
+
+
+def drop_product_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        fts.drop(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0009_product_card_images"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_product_fts, drop_product_fts),
+    ]
@@ -0,0 +1,72 @@
+import re
+
+from django.db import migrations, models
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+COLLECTIONS = [
+    ("all-switch", "All Switch", "switch"),
+    ("air-x", "Air X", "air"),
+    ("transparents-eyeglasses", "Transparent Eyeglasses", "transparent"),
+    ("jj-x-stranger-things", "JJ x Stranger Things", ""),
+]
+
+
+def _words(*texts):
+    return WORD_RE.findall(" ".join(text for text in texts if text).lower())
+
+
+def seed_collections(apps, schema_editor):
+    # Frozen copy of store.promos.keyword_matches as of this migration.
+    Product = apps.get_model("store", "Product")
+    PromoCollection = apps.get_model("store", "PromoCollection")
+    Membership = PromoCollection.products.through
+    rows = [
+        (product_id, _words(name, brand, category))
+        for product_id, name, brand, category in Product.objects.values_list(
+            "id", "name", "brand__name", "category__name"
+        )
+    ]
+    memberships = []
+    for slug, title, keyword in COLLECTIONS:
+        collection, _ = PromoCollection.objects.get_or_create(slug=slug, defaults={"title": title, "keyword": keyword})
+        prefixes = _words(keyword)
+        for product_id, words in rows:
+            if not prefixes or any(word.startswith(prefix) for prefix in prefixes for word in words):
+                memberships.append(Membership(promocollection_id=collection.id, product_id=product_id))
+    Membership.objects.bulk_create(memberships, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0010_product_fts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PromoCollection",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("slug", models.SlugField(unique=True)),
+                ("title", models.CharField(max_length=120)),
+                (
+                    "keyword",
+                    models.CharField(
+                        blank=True,
+                        help_text="Products whose name, brand or category has a word starting with this keyword. "
+                        "Leave blank to include the whole catalog.",
+                        max_length=100,
+                    ),
+                ),
+                ("active", models.BooleanField(default=True)),
+                (
+                    "products",
+                    models.ManyToManyField(
+                        blank=True, editable=False, related_name="promo_collections", to="store.product"
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(seed_collections, migrations.RunPython.noop),
+    ]
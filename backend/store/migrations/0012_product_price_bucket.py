@@ -0,0 +1,23 @@
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0011_promocollection"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="price_bucket",
+            field=models.GeneratedField(
+                db_index=True,
+                db_persist=True,
+                expression=Cast(F("base_price") / 250, models.IntegerField()),
+                output_field=models.IntegerField(),
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def build_summaries(apps, schema_editor):
+    # Frozen copy of store.brand_summaries.refresh_brand_summaries as of this migration.
+    Brand = apps.get_model("store", "Brand")
+    BrandSummary = apps.get_model("store", "BrandSummary")
+    Product = apps.get_model("store", "Product")
+    active = Product.objects.filter(is_active=True, brand__isnull=False)
+    stats = {
+        row["brand_id"]: row
+        for row in active.values("brand_id").annotate(product_count=Count("id"), min_price=Min("base_price")).order_by()
+    }
+    images = {}
+    rows = active.exclude(primary_image="").order_by("brand_id", "-created_at", "-id")
+    for brand_id, image in rows.values_list("brand_id", "primary_image"):
+        images.setdefault(brand_id, image)
+    BrandSummary.objects.bulk_create(
+        [
+            BrandSummary(
+                brand_id=brand_id,
+                product_count=stats.get(brand_id, {}).get("product_count", 0),
+                min_price=stats.get(brand_id, {}).get("min_price"),
+                image=images.get(brand_id, ""),
+            )
+            for brand_id in Brand.objects.values_list("id", flat=True)
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_product_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BrandSummary',
+            fields=[
+                ('brand', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='store.brand')),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('image', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'verbose_name_plural': 'Brand summaries',
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,23 @@
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Cast
+from django.utils import timezone
 from django.utils.text import slugify
 
+from .storage import content_storage
+
+# Width (in rupees) of the price bands stored in Product.price_bucket.
+PRICE_BUCKET_WIDTH = 250
+
+# What is stored about each catalog image, as ``<image field>_<detail>`` columns
+# on its model and on the copies made for product cards and brand summaries.
+IMAGE_DETAILS = ("hash", "width", "height", "color", "placeholder")
+
 
 class UnrestrictedImageField(models.ImageField):
     def __init__(self, *args, **kwargs):
+        # Uploads are stored once per content, under their hash.
+        kwargs.setdefault("storage", content_storage)
         super().__init__(*args, **kwargs)
         # Allow uploads without relying on filename extensions.
         self.validators = []
@@ -11,6 +25,7 @@ class UnrestrictedImageField(models.ImageField):
     def deconstruct(self):
         name, path, args, kwargs = super().deconstruct()
         # Keep migrations stable by treating this like a standard ImageField.
+        kwargs.pop("storage", None)
         return name, "django.db.models.ImageField", args, kwargs
 
 
@@ -18,11 +33,25 @@ class Brand(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(unique=True)
     logo = UnrestrictedImageField(upload_to='brands/', blank=True, null=True)
+    # SHA-256 of the logo, naming its renditions; set by store.renditions.
+    logo_hash = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+    # Read from the file once it's stored, so templates never have to open it.
+    logo_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    logo_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    logo_color = models.CharField(max_length=7, blank=True, editable=False)
+    logo_placeholder = models.TextField(blank=True, editable=False)
     active = models.BooleanField(default=True)
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so a save that keeps the name can skip the promo refresh.
+        instance._loaded_name = instance.__dict__.get("name")
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
@@ -33,6 +62,11 @@ class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(unique=True)
     image = UnrestrictedImageField(upload_to='categories/', blank=True, null=True)
+    image_hash = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_color = models.CharField(max_length=7, blank=True, editable=False)
+    image_placeholder = models.TextField(blank=True, editable=False)
     active = models.BooleanField(default=True)
 
     class Meta:
@@ -41,6 +75,13 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so a save that keeps the name can skip the promo refresh.
+        instance._loaded_name = instance.__dict__.get("name")
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
@@ -94,46 +135,177 @@ class Product(models.Model):
     size = models.CharField(max_length=20, choices=SIZE_CHOICES, blank=True)
     weight_group = models.CharField(max_length=20, choices=WEIGHT_CHOICES, blank=True)
     base_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Fixed-width price band kept by the database itself, so bulk writes and
+    # queryset updates can't leave it stale; price filters are IN lookups on it.
+    price_bucket = models.GeneratedField(
+        expression=Cast(F("base_price") / PRICE_BUCKET_WIDTH, models.IntegerField()),
+        output_field=models.IntegerField(),
+        db_persist=True,
+        db_index=True,
+    )
     is_prescription_supported = models.BooleanField(default=True)
     is_active = models.BooleanField(default=True)
     is_trending = models.BooleanField(default=False)
     is_premium = models.BooleanField(default=False)
     is_exclusive = models.BooleanField(default=False)
+    # Card images copied from ProductImage by sync_card_images so listings
+    # never have to join against the images table.
+    primary_image = models.CharField(max_length=255, blank=True, editable=False)
+    primary_image_hash = models.CharField(max_length=64, blank=True, editable=False)
+    primary_image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    primary_image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    primary_image_color = models.CharField(max_length=7, blank=True, editable=False)
+    primary_image_placeholder = models.TextField(blank=True, editable=False)
+    secondary_image = models.CharField(max_length=255, blank=True, editable=False)
+    secondary_image_hash = models.CharField(max_length=64, blank=True, editable=False)
+    secondary_image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    secondary_image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    secondary_image_color = models.CharField(max_length=7, blank=True, editable=False)
+    secondary_image_placeholder = models.TextField(blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Django compiles ``is_active=True`` to a bare column test, which SQLite
+        # can't seek on, so the boolean parts are partial-index conditions.
+        # Category and brand listings already seek on their FK indexes, which
+        # end in the id they are paged by.
+        indexes = [
+            models.Index(fields=["-created_at"], condition=Q(is_active=True), name="product_newest_idx"),
+            models.Index(
+                fields=["-created_at"], condition=Q(is_active=True, is_trending=True), name="product_trending_idx"
+            ),
+            models.Index(
+                fields=["-created_at"], condition=Q(is_active=True, is_premium=True), name="product_premium_idx"
+            ),
+            models.Index(
+                fields=["-created_at"], condition=Q(is_active=True, is_exclusive=True), name="product_exclusive_idx"
+            ),
+            models.Index(fields=["shape", "gender"], condition=Q(is_active=True), name="product_shape_gender_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so a save that moves the product to another brand can
+        # refresh the old brand's summary too.
+        instance._loaded_brand_id = instance.__dict__.get("brand_id")
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
 
+    def _card_image(self, prefix, **kwargs):
+        details = {f"image_{detail}": getattr(self, f"{prefix}_{detail}") for detail in IMAGE_DETAILS}
+        return ProductImage(product=self, image=getattr(self, prefix), **details, **kwargs)
+
     def get_primary_image(self):
-        primary = self.images.filter(is_primary=True).first()
-        if primary:
-            return primary
-        return self.images.first()
+        if self.primary_image:
+            return self._card_image("primary_image", is_primary=True)
+        return None
 
     def get_display_price(self):
         return self.base_price
 
     def get_secondary_image(self):
-        images = self.images.order_by('-is_primary', 'id')
-        if images.count() > 1:
-            return images[1]
+        if self.secondary_image:
+            return self._card_image("secondary_image")
         return None
 
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = UnrestrictedImageField(upload_to='products/')
+    image_hash = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_color = models.CharField(max_length=7, blank=True, editable=False)
+    image_placeholder = models.TextField(blank=True, editable=False)
     is_primary = models.BooleanField(default=False)
 
     def __str__(self):
         return f"{self.product.name} Image"
 
 
+def sync_card_images(product_id):
+    """Copy a product's first two images, primary first, onto its card columns."""
+    images = list(ProductImage.objects.filter(product_id=product_id).order_by("-is_primary", "id")[:2])
+    values = {}
+    for prefix, image in zip(("primary_image", "secondary_image"), images + [None, None]):
+        values[prefix] = image.image.name if image else ""
+        for detail in IMAGE_DETAILS:
+            blank = None if detail in ("width", "height") else ""
+            values[f"{prefix}_{detail}"] = getattr(image, f"image_{detail}") if image else blank
+    Product.objects.filter(pk=product_id).update(updated_at=timezone.now(), **values)
+
+
+class SimilarProduct(models.Model):
+    """One of a product's "similar frames", precomputed by store.recommendations."""
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='similar_links')
+    similar = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "rank"], name="similar_product_rank_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} ~ {self.similar_id}"
+
+
+class PromoCollection(models.Model):
+    slug = models.SlugField(unique=True)
+    title = models.CharField(max_length=120)
+    keyword = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="Products whose name, brand or category has a word starting with this keyword. "
+        "Leave blank to include the whole catalog.",
+    )
+    active = models.BooleanField(default=True)
+    # Materialized by store.promos from the keyword rule; never edited by hand.
+    products = models.ManyToManyField(Product, related_name='promo_collections', blank=True, editable=False)
+
+    def __str__(self):
+        return self.title
+
+
+class BrandSummary(models.Model):
+    """Per-brand card data, maintained by store.brand_summaries on product writes."""
+
+    brand = models.OneToOneField(Brand, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    product_count = models.PositiveIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Card image of the brand's newest active product.
+    image = models.CharField(max_length=255, blank=True)
+    image_hash = models.CharField(max_length=64, blank=True)
+    image_width = models.PositiveIntegerField(null=True, blank=True)
+    image_height = models.PositiveIntegerField(null=True, blank=True)
+    image_color = models.CharField(max_length=7, blank=True)
+    image_placeholder = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Brand summaries'
+
+    def __str__(self):
+        return f"{self.brand} summary"
+
+    def get_image(self):
+        if self.image:
+            details = {f"image_{detail}": getattr(self, f"image_{detail}") for detail in IMAGE_DETAILS}
+            return ProductImage(image=self.image, is_primary=True, **details)
+        return None
+
+
 class Banner(models.Model):
     BANNER_TYPES = [
         ('hero', 'Hero'),
@@ -147,6 +319,11 @@ class Banner(models.Model):
     title = models.CharField(max_length=255, blank=True)
     banner_type = models.CharField(max_length=30, choices=BANNER_TYPES, default='misc')
     image = UnrestrictedImageField(upload_to='banners/')
+    image_hash = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_color = models.CharField(max_length=7, blank=True, editable=False)
+    image_placeholder = models.TextField(blank=True, editable=False)
     link = models.URLField(blank=True, null=True)
     active = models.BooleanField(default=True)
     order = models.PositiveIntegerField(default=0)
@@ -190,3 +367,36 @@ class DeliveryPincode(models.Model):
 
     def __str__(self):
         return self.pincode
+
+
+class RenditionJob(models.Model):
+    """Rendering of one image content hash, queued on upload and run by the rendition_worker command."""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    digest = models.CharField(max_length=64, unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # Rewrite renditions that already exist.
+    force = models.BooleanField(default=False)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["available_at"], condition=Q(status='pending'), name="renditionjob_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.status})"
@@ -0,0 +1,81 @@
+# Query string keys owned by the paginator; listing links strip them before
+# re-appending the active filters.
+CURSOR_PARAMS = ("page", "after", "before")
+
+
+def _cursor(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, number=None, has_next=False, has_previous=False):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        return self.object_list[-1].id if self.object_list else None
+
+    @property
+    def previous_cursor(self):
+        return self.object_list[0].id if self.object_list else None
+
+
+class KeysetPaginator:
+    """Cursor pagination over a ``ProductIdList`` in its stable order (``id``, or search relevance).
+
+    ``?after=<id>`` / ``?before=<id>`` seek from the last or first product shown,
+    so deep pages cost the same as the first one. ``?page=N`` is still honoured
+    for old links. Cursors are looked up in the ids in memory, which may be in
+    relevance order; only the page's own products are fetched.
+    """
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = per_page
+
+    @property
+    def count(self):
+        return len(self.object_list)
+
+    def get_page(self, params):
+        after = _cursor(params.get("after"))
+        before = _cursor(params.get("before"))
+        page = _cursor(params.get("page")) or 1
+        ids = self.object_list.ids
+        if after is not None:
+            start = self.object_list.position(after, after=True)
+        elif before is not None:
+            start = max(self.object_list.position(before) - self.per_page, 0)
+        else:
+            start = min((max(page, 1) - 1) * self.per_page, max(len(ids) - 1, 0))
+            start -= start % self.per_page
+        end = start + self.per_page
+        return KeysetPage(
+            self.object_list[start:end],
+            self,
+            number=start // self.per_page + 1,
+            has_next=end < len(ids),
+            has_previous=start > 0,
+        )
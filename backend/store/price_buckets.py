@@ -0,0 +1,74 @@
+from collections import namedtuple
+
+from django.db.models import Count, Max, Min
+
+from .catalog import versioned
+from .models import PRICE_BUCKET_WIDTH, Product
+
+# Number of price filters offered; fewer when the catalog has fewer bands.
+PRICE_RANGE_COUNT = 5
+
+# ``label`` doubles as the query string value: "<first rupee>-<last rupee>" of
+# the bands it spans, so links keep working after the ranges are re-derived.
+PriceRange = namedtuple("PriceRange", "label buckets min_price max_price count")
+
+# Widest range a query string may ask for (Rs. 1,00,000), so a crafted label
+# can't expand into millions of buckets.
+MAX_RANGE_BUCKETS = 400
+
+
+def price_histogram():
+    """``[(bucket, products, min price, max price), ...]`` for active products, in one query."""
+    return list(
+        Product.objects.filter(is_active=True)
+        .values_list("price_bucket")
+        .annotate(Count("id"), Min("base_price"), Max("base_price"))
+        .order_by("price_bucket")
+    )
+
+
+def derive_ranges(histogram, count=PRICE_RANGE_COUNT):
+    """Group consecutive buckets into ``count`` ranges holding similar numbers of products."""
+    total = sum(products for _, products, _, _ in histogram)
+    groups = []
+    current = []
+    seen = 0
+    for row in histogram:
+        current.append(row)
+        seen += row[1]
+        if seen >= total * (len(groups) + 1) / count:
+            groups.append(current)
+            current = []
+    if current:
+        groups.append(current)
+
+    ranges = []
+    for group in groups:
+        first, last = group[0][0], group[-1][0]
+        ranges.append(
+            PriceRange(
+                label=f"{first * PRICE_BUCKET_WIDTH}-{(last + 1) * PRICE_BUCKET_WIDTH - 1}",
+                buckets=tuple(range(first, last + 1)),
+                min_price=min(row[2] for row in group),
+                max_price=max(row[3] for row in group),
+                count=sum(row[1] for row in group),
+            )
+        )
+    return ranges
+
+
+def buckets_for(label):
+    """Buckets a ``price`` query string value covers, or ``()`` if it isn't a range."""
+    try:
+        low, high = (int(value) for value in label.split("-"))
+    except (AttributeError, ValueError):
+        return ()
+    first, last = low // PRICE_BUCKET_WIDTH, high // PRICE_BUCKET_WIDTH
+    if low < 0 or high < low or last - first >= MAX_RANGE_BUCKETS:
+        return ()
+    return tuple(range(first, last + 1))
+
+
+@versioned()
+def get_price_ranges():
+    return derive_ranges(price_histogram())
@@ -0,0 +1,67 @@
+from django.db import transaction
+
+from .catalog import bump_version
+from .models import Product, PromoCollection
+from .search import tokenize
+
+# What the keyword rule looks at, after the product id.
+RULE_FIELDS = ("name", "brand__name", "category__name")
+
+
+def keyword_matches(keyword, *texts):
+    """The collection rule: some word of ``texts`` starts with a word of ``keyword``.
+
+    A blank keyword matches every product.
+    """
+    prefixes = tokenize(keyword)
+    if not prefixes:
+        return True
+    words = tokenize(" ".join(text for text in texts if text))
+    return any(word.startswith(prefix) for prefix in prefixes for word in words)
+
+
+def refresh_collections(collections=None):
+    """Recompute the membership of ``collections`` (default: all) from scratch."""
+    collections = list(PromoCollection.objects.all() if collections is None else collections)
+    rows = list(Product.objects.values_list("id", *RULE_FIELDS))
+    Membership = PromoCollection.products.through
+    with transaction.atomic():
+        Membership.objects.filter(promocollection__in=collections).delete()
+        Membership.objects.bulk_create(
+            [
+                Membership(promocollection_id=collection.id, product_id=product_id)
+                for collection in collections
+                for product_id, *texts in rows
+                if keyword_matches(collection.keyword, *texts)
+            ],
+            batch_size=500,
+        )
+        bump_version()
+
+
+def sync_product_promos(product_id):
+    """Recompute which collections one product belongs to."""
+    sync_promos(Product.objects.filter(pk=product_id))
+
+
+def sync_promos(products):
+    """Recompute which collections the products of the ``products`` queryset belong to."""
+    rows = list(products.values_list("id", *RULE_FIELDS))
+    if not rows:
+        return
+    Membership = PromoCollection.products.through
+    collections = list(PromoCollection.objects.all())
+    with transaction.atomic():
+        Membership.objects.filter(product_id__in=products.values("id")).delete()
+        Membership.objects.bulk_create(
+            [
+                Membership(promocollection_id=collection.id, product_id=product_id)
+                for product_id, *texts in rows
+                for collection in collections
+                if keyword_matches(collection.keyword, *texts)
+            ],
+            batch_size=500,
+        )
+    # Bump after the write so a reader can't cache the old membership under the
+    # version bumped by the product's own save.
+    bump_version()
@@ -0,0 +1,25 @@
+import re
+
+from django.db import connections
+
+# SQLite reports a full table scan as a bare "SCAN <table>"; lookups read
+# "SEARCH <table> USING INDEX ...", and virtual tables and index-only scans
+# carry a suffix.
+FULL_SCAN_RE = re.compile(r"^SCAN (\w+)$")
+
+
+def explain(sql, params=None, using="default"):
+    """``EXPLAIN QUERY PLAN`` detail lines for ``sql``."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def explain_queryset(queryset):
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    return explain(sql, params, using=queryset.db)
+
+
+def full_scans(plan):
+    """Tables a plan (a list of detail lines) reads with a full table scan."""
+    return {match.group(1) for match in map(FULL_SCAN_RE.match, plan) if match}
@@ -0,0 +1,180 @@
+import math
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog import bump_version
+from .models import Product, SimilarProduct
+
+SIMILAR_LIMIT = 8
+
+# Product column -> score two products earn by sharing its value. Neighbours
+# are only looked for within the product's own category.
+ATTRIBUTE_WEIGHTS = {
+    "shape": 3.0,
+    "frame_type": 2.0,
+    "gender": 2.0,
+    "brand_id": 1.5,
+    "frame_material": 1.0,
+    "color": 1.0,
+    "size": 1.0,
+    "weight_group": 0.5,
+}
+
+# Price is encoded as an angle on a log scale, scored by the cosine of the
+# difference: equal prices earn PRICE_WEIGHT, prices PRICE_RATIO times apart
+# earn nothing and further apart are penalized. The scale is fixed rather
+# than fitted to the catalog so stored scores stay comparable between runs,
+# which incremental refreshes rely on.
+PRICE_WEIGHT = 2.0
+PRICE_RATIO = 8
+
+# Rows scored at once are capped so a block holds at most this many scores
+# (64 MB of float32), however large the category.
+BLOCK_SCORES = 16_000_000
+
+UPDATE_BATCH_SIZE = 500
+
+
+def encode(rows):
+    """One float32 vector per ``(base_price, *ATTRIBUTE_WEIGHTS values)`` row.
+
+    Attributes are one-hot columns scaled by the square root of their weight,
+    so the dot product of two vectors is their similarity score.
+    """
+    columns = {}
+    cells = []
+    for position, (_, *values) in enumerate(rows):
+        for attribute, value in zip(ATTRIBUTE_WEIGHTS, values):
+            if value in ("", None):
+                continue
+            column = columns.setdefault((attribute, value), len(columns))
+            cells.append((position, column, math.sqrt(ATTRIBUTE_WEIGHTS[attribute])))
+
+    matrix = np.zeros((len(rows), len(columns) + 2), dtype=np.float32)
+    if cells:
+        positions, columns_, weights = zip(*cells)
+        matrix[positions, columns_] = weights
+    prices = np.array([max(float(price), 1.0) for price, *_ in rows], dtype=np.float64)
+    angles = np.log(prices) * (math.pi / 2) / math.log(PRICE_RATIO)
+    matrix[:, -2] = math.sqrt(PRICE_WEIGHT) * np.cos(angles)
+    matrix[:, -1] = math.sqrt(PRICE_WEIGHT) * np.sin(angles)
+    return matrix
+
+
+def nearest(matrix, rows, candidates, k=SIMILAR_LIMIT):
+    """The best ``k`` of ``candidates`` for each of ``rows``, as ``[(candidate, score), ...]`` lists.
+
+    ``rows`` and ``candidates`` are sorted row indices into ``matrix``; a row
+    is never its own neighbour. Scoring is done a block of rows at a time,
+    with one matrix product and one partial sort per block.
+    """
+    if not len(rows) or not len(candidates):
+        return [[] for _ in rows]
+    k = min(k, len(candidates))
+    pool = matrix[candidates].T
+    block = max(1, BLOCK_SCORES // len(candidates))
+    results = []
+    for start in range(0, len(rows), block):
+        block_rows = rows[start : start + block]
+        scores = matrix[block_rows] @ pool
+        # Rule out each row scoring itself.
+        slots = np.searchsorted(candidates, block_rows)
+        slots[slots == len(candidates)] = 0
+        own = np.flatnonzero(candidates[slots] == block_rows)
+        scores[own, slots[own]] = -np.inf
+
+        top = np.argpartition(scores, -k, axis=1)[:, -k:]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        for columns, values in zip(candidates[top].tolist(), top_scores.tolist()):
+            results.append([(column, score) for column, score in zip(columns, values) if score != -np.inf])
+    return results
+
+
+def refresh_similar_products(full=False, k=SIMILAR_LIMIT):
+    """Bring the stored neighbours up to date; returns how many products were rewritten.
+
+    Products changed since their neighbours were computed, and products with
+    a neighbour that changed or left the catalog, are scored against their
+    whole category. Every other product only scores the changed ones, as
+    candidates to merge into its current list. ``full`` recomputes everything.
+    """
+    started = timezone.now()
+    rows = list(
+        Product.objects.filter(is_active=True)
+        .order_by("id")
+        .values_list("id", "category_id", "updated_at", "base_price", *ATTRIBUTE_WEIGHTS)
+    )
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    matrix = encode([row[3:] for row in rows])
+    categories = defaultdict(list)
+    for position, row in enumerate(rows):
+        categories[row[1]].append(position)
+
+    stored = defaultdict(list)
+    computed = {}
+    if not full:
+        links = SimilarProduct.objects.order_by("product_id", "rank").values_list(
+            "product_id", "similar_id", "score", "computed_at"
+        )
+        for product_id, similar_id, score, computed_at in links:
+            stored[product_id].append((similar_id, score))
+            computed[product_id] = computed_at
+
+    active = set(ids.tolist())
+    changed = {
+        product_id
+        for product_id, _, updated_at, *_ in rows
+        if full or product_id not in computed or updated_at > computed[product_id]
+    }
+    # Deleting a product cascades to the links pointing at it, so a short list
+    # has lost a neighbour just like one naming a changed or inactive product.
+    dirty = changed | {
+        product_id
+        for product_id, category_id, *_ in rows
+        if len(stored[product_id]) < min(k, len(categories[category_id]) - 1)
+        or any(similar_id in changed or similar_id not in active for similar_id, _ in stored[product_id])
+    }
+
+    results = {}
+    for members in categories.values():
+        members = np.array(members)
+        member_ids = ids[members]
+        recompute = members[np.isin(member_ids, list(dirty))]
+        for product_id, neighbours in zip(ids[recompute].tolist(), nearest(matrix, recompute, members, k)):
+            results[product_id] = [(int(ids[column]), score) for column, score in neighbours]
+
+        new = members[np.isin(member_ids, list(changed))]
+        clean = members[~np.isin(member_ids, list(dirty))]
+        for product_id, candidates in zip(ids[clean].tolist(), nearest(matrix, clean, new, k)):
+            current = stored[product_id]
+            merged = current + [(int(ids[column]), score) for column, score in candidates]
+            merged = sorted(merged, key=lambda link: -link[1])[:k]
+            if merged != current:
+                results[product_id] = merged
+
+    rewritten = sorted(set(results) | (set(stored) - active))
+    with transaction.atomic():
+        if full:
+            SimilarProduct.objects.all().delete()
+        else:
+            for start in range(0, len(rewritten), UPDATE_BATCH_SIZE):
+                SimilarProduct.objects.filter(product_id__in=rewritten[start : start + UPDATE_BATCH_SIZE]).delete()
+        SimilarProduct.objects.bulk_create(
+            [
+                SimilarProduct(
+                    product_id=product_id, similar_id=similar_id, rank=rank, score=score, computed_at=started
+                )
+                for product_id, neighbours in results.items()
+                for rank, (similar_id, score) in enumerate(neighbours)
+            ],
+            batch_size=UPDATE_BATCH_SIZE,
+        )
+        if rewritten:
+            bump_version()
+    return len(rewritten)
@@ -0,0 +1,183 @@
+import os
+import socket
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+
+import django
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .brand_summaries import refresh_brand_summaries
+from .catalog import BANNERS, CATALOG, bump_version
+from .models import IMAGE_DETAILS, ProductImage, RenditionJob
+from .renditions import IMAGE_FIELDS, describe_file, render_file, source_name, sync_card_details
+
+# Attempts before a job is given up as failed; retries back off from RETRY_DELAY, doubling.
+MAX_ATTEMPTS = 5
+RETRY_DELAY = timedelta(seconds=30)
+
+# A job left running this long belongs to a worker that died; it is queued again.
+STALE_AFTER = timedelta(minutes=15)
+
+# Jobs kept submitted per worker process, so none sits idle between claims.
+JOBS_PER_PROCESS = 4
+
+BATCH_SIZE = 500
+
+
+def enqueue_renditions(digests, force=False):
+    """Queue rendering of the content hashes ``digests``; returns how many jobs were queued.
+
+    Each hash has one job however many images share it. A failed job is
+    queued again, since its image may have been re-uploaded; a done one only
+    with ``force``, which rewrites renditions that exist.
+    """
+    digests = sorted({digest for digest in digests if digest})
+    requeue = [RenditionJob.FAILED, RenditionJob.DONE] if force else [RenditionJob.FAILED]
+    now = timezone.now()
+    queued = 0
+    for start in range(0, len(digests), BATCH_SIZE):
+        batch = digests[start : start + BATCH_SIZE]
+        existing = set(RenditionJob.objects.filter(digest__in=batch).values_list("digest", flat=True))
+        RenditionJob.objects.bulk_create(
+            [RenditionJob(digest=digest, force=force) for digest in batch if digest not in existing],
+            ignore_conflicts=True,
+        )
+        queued += len(batch) - len(existing)
+        queued += RenditionJob.objects.filter(digest__in=batch, status__in=requeue).update(
+            status=RenditionJob.PENDING, force=force, attempts=0, last_error="", available_at=now, updated_at=now
+        )
+        if force:
+            RenditionJob.objects.filter(digest__in=batch, status=RenditionJob.PENDING).update(force=True)
+    return queued
+
+
+def _init_process():
+    # A no-op under fork; spawned processes start without Django set up.
+    django.setup()
+
+
+def rendition_pool(processes=None):
+    """Process pool for rendering, one process per core by default."""
+    # Forked processes must not share the parent's database connections.
+    connections.close_all()
+    return ProcessPoolExecutor(processes or os.cpu_count() or 1, initializer=_init_process)
+
+
+def describe_all_images(pool, redescribe=False):
+    """Store the IMAGE_DETAILS of every catalog image lacking them (all with ``redescribe``), reading on ``pool``.
+
+    Returns how many images were described.
+    """
+    described = 0
+    for model, field, hash_field in IMAGE_FIELDS:
+        images = model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True})
+        if not redescribe:
+            images = images.filter(Q(**{hash_field: ""}) | Q(**{f"{field}_width__isnull": True}))
+        rows = list(images.order_by("pk").values_list("pk", field))
+        columns = {detail: f"{field}_{detail}" for detail in IMAGE_DETAILS}
+        # Files Pillow can't decode only get a hash; their other details are blanked.
+        blank = {detail: model._meta.get_field(column).get_default() for detail, column in columns.items()}
+        updates = [
+            model(pk=pk, **{column: details.get(detail, blank[detail]) for detail, column in columns.items()})
+            for (pk, _), details in zip(rows, pool.map(describe_file, [name for _, name in rows], chunksize=64))
+            if details
+        ]
+        with transaction.atomic():
+            model.objects.bulk_update(updates, list(columns.values()), batch_size=BATCH_SIZE)
+        described += len(updates)
+
+    product_ids = list(ProductImage.objects.values_list("product_id", flat=True).distinct())
+    for start in range(0, len(product_ids), BATCH_SIZE):
+        sync_card_details(product_ids[start : start + BATCH_SIZE])
+    refresh_brand_summaries()
+    bump_version(CATALOG, BANNERS)
+    return described
+
+
+def queue_all_images(pool, redescribe=False, force=True):
+    """Describe catalog images as ``describe_all_images`` does, then queue the renditions of all of them.
+
+    With ``force``, renditions already rendered are rendered again.
+    Returns ``(images described, jobs queued)``.
+    """
+    described = describe_all_images(pool, redescribe=redescribe)
+    digests = set()
+    for model, field, hash_field in IMAGE_FIELDS:
+        digests.update(model.objects.exclude(**{hash_field: ""}).values_list(hash_field, flat=True).distinct())
+    return described, enqueue_renditions(digests, force=force)
+
+
+def _claim(worker_id, limit):
+    now = timezone.now()
+    RenditionJob.objects.filter(status=RenditionJob.RUNNING, updated_at__lt=now - STALE_AFTER).update(
+        status=RenditionJob.PENDING, claimed_by="", updated_at=now
+    )
+    pending = RenditionJob.objects.filter(status=RenditionJob.PENDING, available_at__lte=now)
+    ids = list(pending.order_by("available_at", "pk").values_list("pk", flat=True)[:limit])
+    # Only jobs still pending are taken, so two workers never claim the same one.
+    RenditionJob.objects.filter(pk__in=ids, status=RenditionJob.PENDING).update(
+        status=RenditionJob.RUNNING, claimed_by=worker_id, updated_at=now
+    )
+    return list(RenditionJob.objects.filter(pk__in=ids, status=RenditionJob.RUNNING, claimed_by=worker_id))
+
+
+def _finish(job, error=None):
+    """Mark ``job`` done, or schedule its retry; returns the stat it counts toward."""
+    now = timezone.now()
+    values = {"claimed_by": "", "updated_at": now}
+    if error is None:
+        values.update(status=RenditionJob.DONE, force=False, last_error="")
+        stat = "done"
+    elif job.attempts + 1 >= MAX_ATTEMPTS:
+        values.update(status=RenditionJob.FAILED, attempts=job.attempts + 1, last_error=error)
+        stat = "failed"
+    else:
+        values.update(
+            status=RenditionJob.PENDING,
+            attempts=job.attempts + 1,
+            last_error=error,
+            available_at=now + RETRY_DELAY * 2**job.attempts,
+        )
+        stat = "retried"
+    RenditionJob.objects.filter(pk=job.pk).update(**values)
+    return stat
+
+
+def run_worker(pool, processes, once=False, poll_interval=2.0, progress=None):
+    """Render queued jobs on ``pool`` until stopped, or until none are ready with ``once``.
+
+    Decoding and resizing run in the pool; this process only claims jobs and
+    records results, keeping ``JOBS_PER_PROCESS`` jobs per process in flight.
+    ``progress`` is called with the running stats every ``BATCH_SIZE`` jobs.
+    Returns the stats: jobs done, retried and failed.
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    stats = Counter()
+    in_flight = {}
+    while True:
+        capacity = processes * JOBS_PER_PROCESS - len(in_flight)
+        if capacity > processes:
+            for job in _claim(worker_id, capacity):
+                name = source_name(job.digest)
+                if name is None:
+                    stats[_finish(job, "No catalog image has this content hash.")] += 1
+                    continue
+                in_flight[pool.submit(render_file, name, job.digest, job.force)] = job
+        if not in_flight:
+            if once:
+                return stats
+            time.sleep(poll_interval)
+            continue
+
+        finished, _ = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+        for future in finished:
+            job = in_flight.pop(future)
+            error = future.exception()
+            stats[_finish(job, None if error is None else f"{type(error).__name__}: {error}")] += 1
+            if progress is not None and sum(stats.values()) % BATCH_SIZE == 0:
+                progress(stats)
@@ -0,0 +1,276 @@
+import base64
+import re
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from PIL import ExifTags, Image, ImageOps
+
+from .brand_summaries import sync_brand_summaries
+from .catalog import BANNERS, CATALOG, bump_version
+from .models import IMAGE_DETAILS, Banner, Brand, Category, Product, ProductImage, RenditionJob
+from .storage import content_hash, content_storage, digest_from_name
+
+# Rendition name -> width in pixels. Originals narrower than a rendition are
+# never upscaled; that rendition is just a re-encoded copy.
+RENDITIONS = {
+    "thumb": 160,
+    "card": 400,
+    "detail": 900,
+    "zoom": 1600,
+}
+
+# Extension -> (Pillow format, content type, save options).
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+RENDITION_DIR = "renditions"
+
+PLACEHOLDER_WIDTH = 16
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# (model, image field, content hash field) for every uploaded catalog image.
+IMAGE_FIELDS = (
+    (ProductImage, "image", "image_hash"),
+    (Banner, "image", "image_hash"),
+    (Brand, "logo", "logo_hash"),
+    (Category, "image", "image_hash"),
+)
+
+# Versions to bump once an image's hash is known, so cached pages link its renditions.
+RENDER_SCOPES = {
+    Banner: (BANNERS,),
+    Category: (CATALOG,),
+}
+
+
+def image_fields(model):
+    """``(image field, hash field)`` of ``model``, or ``None`` if it has no catalog image."""
+    for image_model, field, hash_field in IMAGE_FIELDS:
+        if image_model is model:
+            return field, hash_field
+    return None
+
+
+def rendition_name(digest, rendition, extension):
+    return f"{RENDITION_DIR}/{digest[:2]}/{digest}/{rendition}.{extension}"
+
+
+def rendition_url(digest, rendition, extension):
+    return default_storage.url(rendition_name(digest, rendition, extension))
+
+
+def srcset(digest, extension, original_width=None):
+    """``srcset`` attribute value listing the renditions of an image in one format.
+
+    Renditions are never upscaled, so given the original's width, those wider
+    than it are left out but for the narrowest, which is the original re-encoded.
+    """
+    candidates = []
+    for rendition, width in RENDITIONS.items():
+        if original_width and width >= original_width:
+            candidates.append((rendition, original_width))
+            break
+        candidates.append((rendition, width))
+    return ", ".join(f"{rendition_url(digest, rendition, extension)} {width}w" for rendition, width in candidates)
+
+
+def _flatten(image):
+    # JPEG has no alpha: transparent frame shots go onto white.
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _oriented(original, largest):
+    # JPEGs can decode straight at a reduced scale, much faster than full
+    # size; asking for a square keeps enough pixels whichever way EXIF turns it.
+    original.draft("RGB", (largest, largest))
+    image = ImageOps.exif_transpose(original)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "P") else "RGB")
+    return image
+
+
+def describe(source):
+    """Width, height, dominant colour and placeholder of an open image file, keyed as IMAGE_DETAILS.
+
+    The placeholder is a PLACEHOLDER_WIDTH pixel wide WebP data URI, a few
+    hundred bytes, that browsers stretch into a blur while the image loads.
+    """
+    with Image.open(source) as original:
+        width, height = original.size
+        if original.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+            width, height = height, width
+        tiny = _flatten(_oriented(original, PLACEHOLDER_WIDTH * 4))
+    tiny.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH * 4))
+    palette = tiny.quantize(colors=4)
+    _, index = max(palette.getcolors())
+    color = "#{:02x}{:02x}{:02x}".format(*palette.getpalette()[index * 3 : index * 3 + 3])
+    buffer = BytesIO()
+    tiny.save(buffer, "WEBP", quality=30)
+    placeholder = "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+    return {"width": width, "height": height, "color": color, "placeholder": placeholder}
+
+
+def render_renditions(source, digest, storage=default_storage, force=False):
+    """Write whichever renditions of ``source`` (an open image file) are missing; returns how many.
+
+    The image is decoded once and scaled down rendition by rendition, largest
+    first, each from the one before. ``force`` rewrites existing renditions too.
+    """
+    missing = [
+        (rendition, width, extension)
+        for rendition, width in RENDITIONS.items()
+        for extension in FORMATS
+        if force or not storage.exists(rendition_name(digest, rendition, extension))
+    ]
+    if not missing:
+        return 0
+
+    with Image.open(source) as original:
+        image = _oriented(original, max(width for _, width, _ in missing))
+        for width in sorted({width for _, width, _ in missing}, reverse=True):
+            if image.width > width:
+                image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+            for rendition, rendition_width, extension in missing:
+                if rendition_width != width:
+                    continue
+                pillow_format, _, options = FORMATS[extension]
+                buffer = BytesIO()
+                (image if pillow_format == "WEBP" else _flatten(image)).save(buffer, pillow_format, **options)
+                name = rendition_name(digest, rendition, extension)
+                # Storages pick a fresh name rather than overwrite.
+                storage.delete(name)
+                storage.save(name, ContentFile(buffer.getvalue()))
+    return len(missing)
+
+
+def describe_image(instance, redescribe=False):
+    """Store the IMAGE_DETAILS of ``instance``'s catalog image, unless already stored; returns its hash.
+
+    The hash names the image's renditions, and the rest lets templates lay
+    it out, so they never touch the file. Returns ``None`` when there is no
+    readable file.
+    """
+    field, hash_field = image_fields(type(instance))
+    field_file = getattr(instance, field)
+    if not field_file:
+        return None
+    if getattr(instance, hash_field) and getattr(instance, f"{field}_width") and not redescribe:
+        return getattr(instance, hash_field)
+    described = describe_file(field_file.name)
+    if described is None:
+        return None
+    values = {f"{field}_{detail}": value for detail, value in described.items()}
+    for column, value in values.items():
+        setattr(instance, column, value)
+    type(instance).objects.filter(pk=instance.pk).update(**values)
+    if isinstance(instance, ProductImage):
+        sync_card_details([instance.product_id])
+        sync_brand_summaries(Product.objects.filter(pk=instance.product_id).values_list("brand_id", flat=True))
+    bump_version(*RENDER_SCOPES.get(type(instance), (CATALOG,)))
+    return described["hash"]
+
+
+def sync_card_details(product_ids):
+    """Copy the stored image details onto the card columns of ``product_ids``, in one query."""
+
+    def card_detail(column, detail):
+        images = ProductImage.objects.filter(product_id=OuterRef("pk"), image=OuterRef(column))
+        value = Subquery(images.values(f"image_{detail}")[:1])
+        return value if detail in ("width", "height") else Coalesce(value, Value(""))
+
+    Product.objects.filter(pk__in=product_ids).update(
+        **{
+            f"{column}_{detail}": card_detail(column, detail)
+            for column in ("primary_image", "secondary_image")
+            for detail in IMAGE_DETAILS
+        }
+    )
+
+
+def source_name(digest):
+    """Storage name of an image with content hash ``digest``, or ``None``."""
+    for model, field, hash_field in IMAGE_FIELDS:
+        name = model.objects.filter(**{hash_field: digest}).exclude(**{field: ""}).values_list(field, flat=True).first()
+        if name:
+            return name
+    return None
+
+
+def render_file(name, digest, force=False):
+    """Render the renditions of the stored image ``name``; returns how many.
+
+    Needs no database, so it can run in a worker process. Raises whatever
+    Pillow or the storage raise if the image can't be read.
+    """
+    with default_storage.open(name, "rb") as source:
+        return render_renditions(source, digest, force=force)
+
+
+def hash_file(name):
+    """Content hash of the stored image ``name``, or ``None`` if it can't be read."""
+    try:
+        with default_storage.open(name, "rb") as source:
+            return content_hash(source)
+    except OSError:
+        return None
+
+
+def describe_file(name):
+    """IMAGE_DETAILS of the stored image ``name``, or ``None`` if it can't be read.
+
+    Needs no database, so it can run in a worker process. A file Pillow
+    can't decode still gets its hash.
+    """
+    try:
+        with default_storage.open(name, "rb") as source:
+            # Content-addressed names carry the hash already.
+            described = {"hash": digest_from_name(name) or content_hash(source)}
+            try:
+                described.update(describe(source))
+            except (OSError, Image.DecompressionBombError):
+                pass
+            return described
+    except OSError:
+        return None
+
+
+def references(name):
+    """How many catalog images use the content-addressed file ``name``."""
+    digest = digest_from_name(name)
+    return sum(
+        model.objects.filter(**{hash_field: digest, field: name}).count() for model, field, hash_field in IMAGE_FIELDS
+    )
+
+
+def release(name):
+    """Delete the content-addressed file ``name``, and its renditions, once no image uses it.
+
+    Files under any other name predate content addressing and are left alone,
+    as are files saved within RELEASE_GRACE: their upload may not have
+    committed yet. prune_media releases those later.
+    """
+    digest = digest_from_name(name)
+    if digest is None:
+        return False
+    # Under the lock a save can't find the file in place between the check and the delete.
+    with content_storage.locked():
+        if references(name) or content_storage.is_fresh(name):
+            return False
+        content_storage.delete(name)
+    if not any(model.objects.filter(**{hash_field: digest}).exists() for model, _, hash_field in IMAGE_FIELDS):
+        for rendition in RENDITIONS:
+            for extension in FORMATS:
+                default_storage.delete(rendition_name(digest, rendition, extension))
+        RenditionJob.objects.filter(digest=digest).delete()
+    return True
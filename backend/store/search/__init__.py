@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from ..facet_index import ProductIdList, get_facet_index
+from . import fts
+from .index import SearchIndex, get_search_index, tokenize  # noqa: F401
+
+
+def _memory_search(query, fields=None):
+    return get_search_index().search(query, fields)
+
+
+SEARCH_BACKENDS = {
+    "memory": _memory_search,
+    "fts5": fts.search,
+}
+
+
+def search_ranked(query, fields=None):
+    """``[(product_id, score), ...]`` best first from the ``STORE_SEARCH_BACKEND``."""
+    backend = getattr(settings, "STORE_SEARCH_BACKEND", "memory")
+    try:
+        search = SEARCH_BACKENDS[backend]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"STORE_SEARCH_BACKEND must be one of {', '.join(SEARCH_BACKENDS)}, not {backend!r}."
+        ) from None
+    return search(query, fields)
+
+
+def search_products(query, selections=None, fields=None):
+    """Active products matching ``query`` (in ``fields``) and the facet ``selections``.
+
+    Returns a ``ProductIdList`` ordered by relevance (by id when ``query`` has
+    no tokens) and a ``{product_id: score}`` dict for the ranked case.
+    """
+    facets = get_facet_index()
+    selections = {facet: values for facet, values in (selections or {}).items() if values}
+    if not tokenize(query):
+        mask = facets.match({"is_active": [True], **selections})
+        return ProductIdList(facets.ids_for(mask)), {}
+
+    results = search_ranked(query, fields)
+    if selections:
+        allowed = set(facets.ids_for(facets.match(selections)))
+        results = [(product_id, score) for product_id, score in results if product_id in allowed]
+    return ProductIdList([product_id for product_id, _ in results], ranked=True), dict(results)
+
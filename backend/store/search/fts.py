@@ -0,0 +1,122 @@
+"""SQLite FTS5 search backend.
+
+``store_product_fts`` mirrors the searchable fields of every active product,
+brand and category names included, with the product id as its rowid. Triggers
+on the product, brand and category tables keep it in step with every write,
+``bulk_create`` and queryset ``update`` included. Migrations only create the
+table: the triggers are dropped before ``migrate`` runs and recreated, with a
+full reindex, once it is done (see ``store.signals``).
+"""
+
+from django.db import connection
+
+from .index import SEARCH_FIELDS, tokenize
+
+FTS_TABLE = "store_product_fts"
+
+_SOURCE = """
+    SELECT p.id, p.name, COALESCE(b.name, ''), c.name, p.shape, p.gender,
+           p.frame_type, p.frame_material, p.color
+    FROM store_product p
+    LEFT JOIN store_brand b ON b.id = p.brand_id
+    JOIN store_category c ON c.id = p.category_id
+    WHERE p.is_active
+"""
+
+_INSERT = f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(SEARCH_FIELDS)}) {_SOURCE}"
+
+_TRIGGERS = {
+    "store_product_fts_insert": f"""
+        AFTER INSERT ON store_product BEGIN
+            {_INSERT} AND p.id = NEW.id;
+        END
+    """,
+    "store_product_fts_update": f"""
+        AFTER UPDATE ON store_product BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+            {_INSERT} AND p.id = NEW.id;
+        END
+    """,
+    "store_product_fts_delete": f"""
+        AFTER DELETE ON store_product BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+        END
+    """,
+    "store_brand_fts_update": f"""
+        AFTER UPDATE OF name ON store_brand BEGIN
+            UPDATE {FTS_TABLE} SET brand = NEW.name
+            WHERE rowid IN (SELECT id FROM store_product WHERE brand_id = NEW.id);
+        END
+    """,
+    "store_category_fts_update": f"""
+        AFTER UPDATE OF name ON store_category BEGIN
+            UPDATE {FTS_TABLE} SET category = NEW.name
+            WHERE rowid IN (SELECT id FROM store_product WHERE category_id = NEW.id);
+        END
+    """,
+}
+
+
+def fts5_available(conn=connection):
+    if conn.vendor != "sqlite":
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any(option == "ENABLE_FTS5" for (option,) in cursor.fetchall())
+
+
+def table_exists(conn=connection):
+    return FTS_TABLE in conn.introspection.table_names()
+
+
+def drop_triggers(conn=connection):
+    """Remove the sync triggers, which would break SQLite's table rebuilds during migrations."""
+    with conn.cursor() as cursor:
+        for name in _TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def drop(conn=connection):
+    drop_triggers(conn)
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def create_table(conn=connection):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{', '.join(SEARCH_FIELDS)}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+
+
+def rebuild(conn=connection):
+    """Drop and recreate the FTS table and its triggers, then reindex every product."""
+    drop(conn)
+    create_table(conn)
+    with conn.cursor() as cursor:
+        for name, body in _TRIGGERS.items():
+            cursor.execute(f"CREATE TRIGGER {name} {body}")
+        cursor.execute(_INSERT)
+
+
+def search(query, fields=None):
+    """``[(product_id, score), ...]`` best first, like ``SearchIndex.search``.
+
+    Every token is a prefix query and tokens are OR-ed; ``bm25()`` is given the
+    same per-field weights as the in-memory index.
+    """
+    tokens = sorted(set(tokenize(query)))
+    if not tokens:
+        return []
+    expression = " OR ".join(f'"{token}"*' for token in tokens)
+    if fields:
+        expression = f"{{{' '.join(fields)}}} : ({expression})"
+    weights = ", ".join(str(weight) for _, weight in SEARCH_FIELDS.values())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, -bm25({FTS_TABLE}, {weights}) AS score FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s ORDER BY score DESC, rowid",
+            [expression],
+        )
+        return cursor.fetchall()
@@ -0,0 +1,138 @@
+import math
+import re
+from bisect import bisect_left
+from collections import Counter, namedtuple
+
+from ..catalog import versioned
+from ..models import Product
+
+# Searchable field -> (Product lookup, BM25F weight). A hit in the product
+# name outranks the same word in its brand, category or attributes.
+SEARCH_FIELDS = {
+    "name": ("name", 3.0),
+    "brand": ("brand__name", 2.0),
+    "category": ("category__name", 1.5),
+    "shape": ("shape", 1.0),
+    "gender": ("gender", 1.0),
+    "frame_type": ("frame_type", 1.0),
+    "material": ("frame_material", 1.0),
+    "color": ("color", 1.0),
+}
+
+K1 = 1.2
+B = 0.75
+
+# Query tokens also match longer indexed terms ("ray" -> "rayban") at a
+# discount, once they are long enough not to match half the vocabulary.
+PREFIX_WEIGHT = 0.6
+MIN_PREFIX_LENGTH = 2
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+Document = namedtuple("Document", "values terms lengths")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower()) if text else []
+
+
+def analyze(values):
+    terms = {}
+    lengths = {}
+    for field, value in zip(SEARCH_FIELDS, values):
+        tokens = tokenize(value)
+        lengths[field] = len(tokens)
+        for term, count in Counter(tokens).items():
+            terms.setdefault(term, {})[field] = count
+    return Document(values, terms, lengths)
+
+
+class SearchIndex:
+    """Inverted index over active products, scored with field-weighted BM25."""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.postings = {}
+        totals = Counter()
+        for product_id, document in documents.items():
+            totals.update(document.lengths)
+            for term, field_counts in document.terms.items():
+                self.postings.setdefault(term, {})[product_id] = field_counts
+        count = len(documents) or 1
+        self.avg_lengths = {field: (totals[field] / count) or 1 for field in SEARCH_FIELDS}
+        self.terms = sorted(self.postings)
+
+    @classmethod
+    def build(cls, previous=None):
+        """Index every active product, reusing ``previous`` for unchanged rows.
+
+        Only products whose searchable values changed are re-analysed, so a
+        single edit costs one query plus the tokenizing of that product.
+        """
+        lookups = [lookup for lookup, _ in SEARCH_FIELDS.values()]
+        rows = Product.objects.filter(is_active=True).order_by("id").values_list("id", *lookups)
+        known = previous.documents if previous is not None else {}
+        documents = {}
+        for product_id, *values in rows:
+            values = tuple(values)
+            document = known.get(product_id)
+            documents[product_id] = document if document and document.values == values else analyze(values)
+        return cls(documents)
+
+    def expand(self, token):
+        """Indexed terms ``token`` matches, with the weight of each match."""
+        matches = {}
+        if token in self.postings:
+            matches[token] = 1.0
+        if len(token) >= MIN_PREFIX_LENGTH:
+            position = bisect_left(self.terms, token)
+            while position < len(self.terms) and self.terms[position].startswith(token):
+                matches.setdefault(self.terms[position], PREFIX_WEIGHT)
+                position += 1
+        return matches
+
+    def idf(self, term):
+        matched = len(self.postings[term])
+        return math.log(1 + (len(self.documents) - matched + 0.5) / (matched + 0.5))
+
+    def term_score(self, product_id, field_counts):
+        lengths = self.documents[product_id].lengths
+        tf = sum(
+            SEARCH_FIELDS[field][1] * count / (1 - B + B * lengths[field] / self.avg_lengths[field])
+            for field, count in field_counts.items()
+        )
+        return tf * (K1 + 1) / (K1 + tf)
+
+    def search(self, query, fields=None):
+        """``[(product_id, score), ...]`` for products matching any query token, best first.
+
+        A product scores, per query token, its best match among the terms the
+        token expands to, so a short prefix matching many words of one product
+        doesn't outweigh an exact hit. ``fields`` restricts matching to those
+        fields.
+        """
+        scores = Counter()
+        for token in set(tokenize(query)):
+            best = {}
+            for term, weight in self.expand(token).items():
+                idf = self.idf(term)
+                for product_id, field_counts in self.postings[term].items():
+                    if fields:
+                        field_counts = {field: count for field, count in field_counts.items() if field in fields}
+                        if not field_counts:
+                            continue
+                    score = weight * idf * self.term_score(product_id, field_counts)
+                    if score > best.get(product_id, 0):
+                        best[product_id] = score
+            scores.update(best)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+_latest = None
+
+
+@versioned()
+def get_search_index():
+    global _latest
+    _latest = SearchIndex.build(previous=_latest)
+    return _latest
@@ -0,0 +1,147 @@
+import re
+from collections import Counter, namedtuple
+from urllib.parse import urlencode
+
+from django.urls import reverse
+
+from ..catalog import versioned
+from ..models import Product
+
+# Suggestions kept per trie node; the endpoint never returns more.
+SUGGESTION_LIMIT = 10
+
+Suggestion = namedtuple("Suggestion", "kind label url popularity")
+
+_SEPARATORS = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text):
+    return _SEPARATORS.sub(" ", str(text).lower()).strip()
+
+
+def _rank(suggestion):
+    return (-suggestion.popularity, suggestion.label, suggestion.kind)
+
+
+class _Node:
+    __slots__ = ("children", "entries", "top", "depth")
+
+    def __init__(self, depth):
+        self.children = {}
+        self.entries = {}
+        self.top = ()
+        self.depth = depth
+
+
+class SuggestionTrie:
+    """Prefix trie whose every node holds the best suggestions beneath it.
+
+    Each suggestion is reachable from the start of every word of its label, so
+    "cha" finds "Vincent Chase". A lookup walks one node per character of the
+    prefix and returns that node's precomputed list.
+    """
+
+    def __init__(self, limit=SUGGESTION_LIMIT):
+        self.limit = limit
+        self.root = _Node(0)
+        self.suggestions = {}
+
+    def suggest(self, prefix, limit=SUGGESTION_LIMIT):
+        node = self.root
+        for char in normalize(prefix):
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return list(node.top[:limit]) if node is not self.root else []
+
+    def update(self, suggestions):
+        """Make the trie hold exactly ``suggestions``.
+
+        Only the paths of suggestions that were added, removed or changed are
+        touched, so a catalog edit costs a handful of node updates rather than
+        a rebuild.
+        """
+        wanted = {(suggestion.kind, suggestion.label): suggestion for suggestion in suggestions}
+        dirty = set()
+        for key, suggestion in self.suggestions.items():
+            if wanted.get(key) != suggestion:
+                dirty.update(self._place(key, None))
+        for key, suggestion in wanted.items():
+            if self.suggestions.get(key) != suggestion:
+                dirty.update(self._place(key, suggestion))
+        self.suggestions = wanted
+        # Children before parents, so each node merges up-to-date child lists.
+        for node in sorted(dirty, key=lambda node: -node.depth):
+            candidates = list(node.entries.values())
+            for child in node.children.values():
+                candidates.extend(child.top)
+            node.top = tuple(sorted(set(candidates), key=_rank)[: self.limit])
+
+    def _place(self, key, suggestion):
+        """Set (or, with ``None``, clear) ``key`` at every word start; return the nodes passed."""
+        words = normalize(key[1])
+        path = []
+        for start in [0] + [match.end() for match in re.finditer(" ", words)]:
+            node = self.root
+            path.append(node)
+            for char in words[start:]:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _Node(node.depth + 1)
+                node = child
+                path.append(node)
+            if suggestion is None:
+                node.entries.pop(key, None)
+            else:
+                node.entries[key] = suggestion
+        return path
+
+
+def collect_suggestions():
+    """Product names, brands, categories, shapes, colours and materials, ranked by product count."""
+    rows = Product.objects.filter(is_active=True).values_list(
+        "name", "slug", "brand__name", "brand__slug", "brand__active", "category__name", "category__slug",
+        "shape", "color", "frame_material",
+    )
+    search_url = reverse("product_search")
+    shape_labels = dict(Product.SHAPE_CHOICES)
+    counts = Counter()
+    product_slugs = {}
+    # Resolved once per slug rather than once per product.
+    brand_urls = {}
+    category_urls = {}
+    for name, slug, brand, brand_slug, brand_active, category, category_slug, shape, color, material in rows:
+        counts["product", name] += 1
+        product_slugs[name] = slug
+        if brand and brand_active:
+            if brand_slug not in brand_urls:
+                brand_urls[brand_slug] = reverse("brand_listing", args=[brand_slug])
+            counts["brand", brand, brand_urls[brand_slug]] += 1
+        if category_slug not in category_urls:
+            category_urls[category_slug] = reverse("category", args=[category_slug])
+        counts["category", category, category_urls[category_slug]] += 1
+        if shape:
+            counts["shape", shape_labels.get(shape, shape), f"{search_url}?{urlencode({'shape': shape})}"] += 1
+        if color:
+            counts["color", color, f"{search_url}?{urlencode({'q': color})}"] += 1
+        if material:
+            counts["material", material, f"{search_url}?{urlencode({'q': material})}"] += 1
+
+    suggestions = []
+    for (kind, label, *url), count in counts.items():
+        if kind == "product":
+            # Several products sharing a name suggest a search, not one of them.
+            url = [reverse("product_detail", args=[product_slugs[label]])] if count == 1 else [
+                f"{search_url}?{urlencode({'q': label})}"
+            ]
+        suggestions.append(Suggestion(kind, label, url[0], count))
+    return suggestions
+
+
+_trie = SuggestionTrie()
+
+
+@versioned()
+def get_suggestion_trie():
+    _trie.update(collect_suggestions())
+    return _trie
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from .models import Banner, Brand, Category, Product, ProductImage
+from .models import Banner, Brand, BrandSummary, Category, Product, ProductImage
 
 
 class BannerSerializer(serializers.ModelSerializer):
@@ -9,7 +9,15 @@ class BannerSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class BrandSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BrandSummary
+        fields = ("product_count", "min_price", "image")
+
+
 class BrandSerializer(serializers.ModelSerializer):
+    summary = BrandSummarySerializer(read_only=True)
+
     class Meta:
         model = Brand
         fields = "__all__"
@@ -54,6 +62,7 @@ class ProductReadSerializer(serializers.ModelSerializer):
             "is_trending",
             "is_premium",
             "is_exclusive",
+            "updated_at",
             "images",
         )
 
@@ -0,0 +1,160 @@
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_migrate, pre_save
+from django.dispatch import receiver
+
+from .brand_summaries import sync_brand_summaries
+from .catalog import BANNERS, bump_version
+from .models import (
+    Banner,
+    Brand,
+    BrandSummary,
+    Category,
+    Product,
+    ProductImage,
+    PromoCollection,
+    sync_card_images,
+)
+from .promos import refresh_collections, sync_product_promos, sync_promos
+from .rendition_queue import enqueue_renditions
+from .renditions import describe_image, image_fields, release
+from .search import fts
+
+
+@receiver(pre_save, sender=ProductImage)
+@receiver(pre_save, sender=Banner)
+@receiver(pre_save, sender=Brand)
+@receiver(pre_save, sender=Category)
+def clear_stale_image_hash(sender, instance, **kwargs):
+    field, hash_field = image_fields(sender)
+    field_file = getattr(instance, field)
+    # An uncommitted file is a new upload, which the old hash doesn't describe.
+    if not field_file or not field_file._committed:
+        setattr(instance, hash_field, "")
+        if instance.pk is not None:
+            instance._replaced_image = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Banner)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def queue_image_renditions(sender, instance, **kwargs):
+    # Describing reads the file once and decodes it at a fraction of its size;
+    # rendering is left to rendition_worker.
+    field, hash_field = image_fields(sender)
+    if getattr(instance, field) and not getattr(instance, hash_field):
+        enqueue_renditions([describe_image(instance)])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Banner)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def release_replaced_image(sender, instance, **kwargs):
+    replaced = getattr(instance, "_replaced_image", None)
+    instance._replaced_image = None
+    if replaced and replaced != getattr(instance, image_fields(sender)[0]).name:
+        transaction.on_commit(lambda: release(replaced))
+
+
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=Banner)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+def release_deleted_image(sender, instance, **kwargs):
+    name = getattr(instance, image_fields(sender)[0]).name
+    if name:
+        transaction.on_commit(lambda: release(name))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_catalog_version(sender, **kwargs):
+    bump_version()
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def bump_banner_version(sender, **kwargs):
+    bump_version(BANNERS)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def sync_product_card_images(sender, instance, **kwargs):
+    sync_card_images(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+def resync_card_images(sender, instance, created, **kwargs):
+    # A full save writes the card columns from the in-memory instance, which
+    # may predate the product's latest image changes.
+    if not created:
+        sync_card_images(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def sync_promo_memberships(sender, instance, **kwargs):
+    sync_product_promos(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def sync_product_brand_summaries(sender, instance, **kwargs):
+    sync_brand_summaries({instance.brand_id, getattr(instance, "_loaded_brand_id", None)})
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def sync_image_brand_summary(sender, instance, **kwargs):
+    # The summary image is a product card image, which the image just changed.
+    sync_brand_summaries(Product.objects.filter(pk=instance.product_id).values_list("brand_id", flat=True))
+
+
+@receiver(post_save, sender=Brand)
+def create_brand_summary(sender, instance, created, **kwargs):
+    if created:
+        BrandSummary.objects.get_or_create(brand=instance)
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def refresh_promo_collections(sender, instance, created, **kwargs):
+    # The keyword rule reads brand and category names, so only a rename moves
+    # products in or out, and only this brand's or category's. A new one has
+    # no products yet.
+    if created or instance.name == getattr(instance, "_loaded_name", None):
+        return
+    sync_promos(Product.objects.filter(**{"brand" if sender is Brand else "category": instance}))
+    instance._loaded_name = instance.name
+
+
+@receiver(post_save, sender=PromoCollection)
+def refresh_promo_collection(sender, instance, **kwargs):
+    refresh_collections([instance])
+
+
+@receiver(post_delete, sender=PromoCollection)
+def bump_promo_version(sender, **kwargs):
+    bump_version()
+
+
+@receiver(pre_migrate)
+def drop_fts_triggers(sender, using, **kwargs):
+    # SQLite rebuilds a table to alter it, and triggers on other tables that
+    # still name the old one make the rebuild fail. They are put back, and the
+    # index refilled, once migrations are done.
+    if sender.name == "store" and connections[using].vendor == "sqlite":
+        fts.drop_triggers(connections[using])
+
+
+@receiver(post_migrate)
+def rebuild_fts(sender, using, **kwargs):
+    if sender.name == "store" and fts.table_exists(connections[using]):
+        fts.rebuild(connections[using])
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import posixpath
+import re
+import time
+import uuid
+from contextlib import contextmanager, suppress
+from datetime import timedelta
+
+from django.core.files import locks
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+
+ORIGINALS_DIR = "originals"
+
+# A file saved or found in place this recently may belong to an upload whose
+# row isn't committed yet, so it is never deleted as unreferenced.
+RELEASE_GRACE = timedelta(hours=1)
+
+HASH_CHUNK_SIZE = 1 << 20
+
+# Name of a file stored by ContentAddressedStorage; group 1 is its content hash.
+HASHED_NAME_RE = re.compile(rf"^{ORIGINALS_DIR}/[0-9a-f]{{2}}/([0-9a-f]{{64}})(\.[a-z0-9]{{1,10}})?$")
+
+
+def content_hash(file):
+    """SHA-256 hex digest of an open file's contents."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def hashed_name(digest, name):
+    """Where content with hash ``digest`` uploaded as ``name`` is stored."""
+    extension = posixpath.splitext(name)[1].lower()
+    if not re.fullmatch(r"\.[a-z0-9]{1,10}", extension):
+        extension = ""
+    return f"{ORIGINALS_DIR}/{digest[:2]}/{digest}{extension}"
+
+
+def digest_from_name(name):
+    """Content hash of a file stored by ContentAddressedStorage, or ``None`` for any other name."""
+    match = HASHED_NAME_RE.match(name or "")
+    return match.group(1) if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores each upload under its content hash rather than its filename.
+
+    The same content uploaded twice, as any model's image, is stored once.
+    Files are never overwritten, so their URLs can be cached forever;
+    store.renditions deletes them once no image references them.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = hashed_name(content_hash(content), name)
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        self._makedirs(directory)
+        # Written under a temporary name and linked into place, so the file
+        # appears whole and a concurrent save of the same content can't make
+        # the storage pick an alternate name.
+        temporary = os.path.join(directory, f".{uuid.uuid4().hex}.tmp")
+        with self.locked():
+            if os.path.exists(path):
+                # Freshened, so a concurrent release leaves it in place.
+                os.utime(path)
+                return name
+            try:
+                fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+                with os.fdopen(fd, "wb") as file:
+                    for chunk in content.chunks():
+                        file.write(chunk)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temporary, self.file_permissions_mode)
+                try:
+                    os.link(temporary, path)
+                except FileExistsError:
+                    # Stored meanwhile by a writer not holding the lock; the content is the same.
+                    pass
+            finally:
+                with suppress(FileNotFoundError):
+                    os.remove(temporary)
+        return name
+
+    def _makedirs(self, directory):
+        if self.directory_permissions_mode is None:
+            os.makedirs(directory, exist_ok=True)
+            return
+        old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+        try:
+            os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+        finally:
+            os.umask(old_umask)
+
+    @contextmanager
+    def locked(self):
+        """Hold the lock that saves and releases of content-addressed files take."""
+        path = self.path(f"{ORIGINALS_DIR}/.lock")
+        self._makedirs(os.path.dirname(path))
+        with open(path, "ab") as file:
+            locks.lock(file, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(file)
+
+    def is_fresh(self, name, grace=RELEASE_GRACE):
+        """Whether ``name`` was saved, or found in place by a save, within ``grace``."""
+        try:
+            return time.time() - os.path.getmtime(self.path(name)) < grace.total_seconds()
+        except FileNotFoundError:
+            return False
+
+
+content_storage = ContentAddressedStorage()
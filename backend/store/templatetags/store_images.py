@@ -0,0 +1,62 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from ..models import IMAGE_DETAILS
+from ..renditions import image_fields, rendition_url, srcset
+
+register = template.Library()
+
+# Rendition -> ``sizes`` attribute: how wide the slot it's used for is drawn.
+SIZES = {
+    "thumb": "160px",
+    "card": "(max-width: 576px) 50vw, (max-width: 992px) 33vw, 400px",
+    "detail": "(max-width: 992px) 100vw, 900px",
+    "zoom": "100vw",
+}
+
+
+def _layout_attributes(width, height, color, placeholder):
+    # aspect-ratio rather than width/height attributes: card CSS often sets a
+    # width alone, which a height attribute would then stretch.
+    style = []
+    if width and height:
+        style.append(f"aspect-ratio: {width} / {height}")
+    if color or placeholder:
+        style.append(f"background: {color or 'transparent'} url({placeholder}) center / cover no-repeat")
+    if not style:
+        return {}
+    attributes = {"style": "; ".join(style)}
+    if color or placeholder:
+        # The placeholder would show around images drawn with object-fit: contain.
+        attributes["onload"] = "this.style.removeProperty('background')"
+    return attributes
+
+
+@register.simple_tag
+def picture(instance, rendition="card", **attrs):
+    """``<img>`` of a catalog image, offering every rendition in WebP with JPEG fallback.
+
+    ``attrs`` become attributes of the ``<img>`` (``class_`` for ``class``).
+    The stored details reserve the image's space and paint its placeholder
+    until it loads, without opening the file. Images not hashed yet fall
+    back to the original upload. The ``<picture>`` wrapper is ``display:
+    contents`` so card CSS written for a bare ``<img>`` still applies.
+    """
+    field, _ = image_fields(type(instance))
+    digest, width, height, color, placeholder = (getattr(instance, f"{field}_{detail}") for detail in IMAGE_DETAILS)
+    attrs = {**_layout_attributes(width, height, color, placeholder), **attrs}
+    attributes = format_html_join("", ' {}="{}"', ((name.rstrip("_"), value) for name, value in attrs.items()))
+    if not digest:
+        return format_html('<img src="{}"{}>', getattr(instance, field).url, attributes)
+    return format_html(
+        '<picture style="display: contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}>'
+        "</picture>",
+        srcset(digest, "webp", width),
+        SIZES[rendition],
+        rendition_url(digest, rendition, "jpg"),
+        srcset(digest, "jpg", width),
+        SIZES[rendition],
+        attributes,
+    )
@@ -1,3 +1,932 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from itertools import cycle, islice
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.http import QueryDict
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from .brand_summaries import refresh_brand_summaries
+from .catalog import bump_version, get_version
+from .facet_index import FACET_FIELDS, FacetIndex
+from .filter_spec import FilterSpec
+from .listing_cache import listing_cache_context
+from .models import (
+    Banner,
+    Brand,
+    BrandSummary,
+    Category,
+    Product,
+    ProductImage,
+    PromoCollection,
+    RenditionJob,
+    SimilarProduct,
+)
+from .price_buckets import MAX_RANGE_BUCKETS, PriceRange, buckets_for, derive_ranges
+from .promos import refresh_collections
+from .query_plans import explain, full_scans
+from .recommendations import SIMILAR_LIMIT, refresh_similar_products
+from .rendition_queue import rendition_pool, run_worker
+from .renditions import RENDITIONS, rendition_name
+from .search import search_ranked
+from .storage import RELEASE_GRACE, content_storage
+
+# Products seeded for the query budget tests. Budgets must not depend on it;
+# run with e.g. STORE_TEST_CATALOG_SIZE=5000 to check they hold at scale.
+CATALOG_SIZE = int(os.getenv("STORE_TEST_CATALOG_SIZE", "60"))
+
+TEST_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "catalog_versions": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "versions"},
+}
+
+
+def clear_caches():
+    """Empty every cache, catalog versions included, so per-worker structures are rebuilt."""
+    for backend in caches.all():
+        backend.clear()
+
+
+def _take(values, count):
+    return list(islice(cycle(values), count))
+
+
+def seed_catalog(size=CATALOG_SIZE):
+    """Brands, categories, ``size`` products with card images, banners, promo memberships and brand summaries."""
+    categories = [
+        Category.objects.create(name="Eyeglasses", slug="eyeglasses"),
+        Category.objects.create(name="Sunglasses", slug="sunglasses"),
+    ]
+    brands = [
+        Brand.objects.create(name="Vincent Chase", slug="vincent-chase"),
+        Brand.objects.create(name="Fossil", slug="fossil"),
+        Brand.objects.create(name="Air Flex", slug="air-flex"),
+    ]
+    shapes = [value for value, _ in Product.SHAPE_CHOICES]
+    genders = [value for value, _ in Product.GENDER_CHOICES]
+    frame_types = [value for value, _ in Product.FRAME_TYPE_CHOICES]
+    sizes = [value for value, _ in Product.SIZE_CHOICES]
+    weights = [value for value, _ in Product.WEIGHT_CHOICES]
+    colors = ["Black", "Blue", "Gold", "Transparent"]
+    columns = zip(
+        range(size),
+        _take(categories, size),
+        _take(brands, size),
+        _take(shapes, size),
+        _take(genders, size),
+        _take(frame_types, size),
+        _take(sizes, size),
+        _take(weights, size),
+        _take(colors, size),
+    )
+    products = Product.objects.bulk_create(
+        [
+            Product(
+                category=category,
+                brand=brand,
+                name=f"{brand.name} {shape.title()} {i}",
+                slug=f"product-{i}",
+                gender=gender,
+                shape=shape,
+                frame_type=frame_type,
+                frame_material="Acetate",
+                color=color,
+                size=frame_size,
+                weight_group=weight,
+                base_price=999 + (i % 10) * 150,
+                is_trending=i % 3 == 0,
+                is_premium=i % 4 == 0,
+                is_exclusive=i % 5 == 0,
+                primary_image=f"products/{i}-front.png",
+                secondary_image=f"products/{i}-side.png",
+            )
+            for i, category, brand, shape, gender, frame_type, frame_size, weight, color in columns
+        ]
+    )
+    ProductImage.objects.bulk_create(
+        [
+            ProductImage(product=product, image=f"products/{product.slug}-{side}.png", is_primary=side == "front")
+            for product in products
+            for side in ("front", "side")
+        ]
+    )
+    Banner.objects.bulk_create(
+        [
+            Banner(title=banner_type.title(), banner_type=banner_type, image=f"banners/{banner_type}.png", order=order)
+            for order, (banner_type, _) in enumerate(Banner.BANNER_TYPES)
+        ]
+    )
+    refresh_collections()
+    refresh_brand_summaries()
+    return products
+
+
+@override_settings(CACHES=TEST_CACHES, STORE_SEARCH_BACKEND="memory")
+class QueryBudgetTestCase(TestCase):
+    """Base for tests that pin how many queries a view may run and how it plans them.
+
+    Every test starts with an empty cache, so the catalog version moves and
+    the first request rebuilds each per-worker index: the budgets are for a
+    cold worker, the worst case.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = seed_catalog()
+
+    def setUp(self):
+        clear_caches()
+
+    def assertQueryBudget(self, url, max_queries, allow_scans=(), method="get", data=None, status=200, **extra):
+        """Request ``url`` and check its query count and that no query fully scans a table.
+
+        ``allow_scans`` names tables a view is expected to read in full, such
+        as ``store_product`` while building the catalog-wide facet index.
+        ``extra`` is passed on to the test client, e.g. request headers.
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data, **extra)
+        self.assertEqual(response.status_code, status, url)
+
+        queries = [query["sql"] for query in context.captured_queries]
+        self.assertLessEqual(
+            len(queries), max_queries, f"{url} ran {len(queries)} queries:\n" + "\n".join(queries)
+        )
+        for sql in queries:
+            if not sql.startswith("SELECT"):
+                continue
+            scans = full_scans(explain(sql)) - set(allow_scans)
+            self.assertFalse(scans, f"{url} fully scans {', '.join(sorted(scans))}:\n{sql}")
+        return response
+
+
+# Tables a cold worker reads in full, once, to build its in-memory indexes.
+INDEX_BUILD_SCANS = ("store_product", "store_promocollection_products")
+
+
+class StorefrontQueryBudgetTests(QueryBudgetTestCase):
+    def test_home(self):
+        # The snapshot reads the small banner, brand summary and category tables whole.
+        self.assertQueryBudget("/", 7, allow_scans=("store_banner", "store_brandsummary", "store_category"))
+        self.assertQueryBudget("/", 0)
+
+    def test_category(self):
+        self.assertQueryBudget("/category/eyeglasses/", 5, allow_scans=INDEX_BUILD_SCANS)
+        self.assertQueryBudget("/category/eyeglasses/", 0)
+
+    def test_category_filtered_page(self):
+        url = "/category/eyeglasses/?shape=round&shape=oval&price=750-1249&after=5"
+        self.assertQueryBudget(url, 5, allow_scans=INDEX_BUILD_SCANS)
+        self.assertQueryBudget("/category/eyeglasses/?color=Black", 1)
+
+    def test_unknown_category(self):
+        self.assertQueryBudget("/category/missing/", 2, status=404)
+
+    def test_shape_gender(self):
+        self.assertQueryBudget("/eyeglasses/frame-shape/round/men/", 5, allow_scans=INDEX_BUILD_SCANS)
+        self.assertQueryBudget("/eyeglasses/frame-shape/round/men/?category=eyeglasses", 1)
+
+    def test_brand_listing(self):
+        # The header reads the brand's summary row on top of the brand itself.
+        self.assertQueryBudget("/brands/fossil.html", 6, allow_scans=INDEX_BUILD_SCANS)
+        self.assertQueryBudget("/brands/fossil.html?page=2", 1)
+
+    def test_promo_collections(self):
+        self.assertQueryBudget("/all-switch.html", 5, allow_scans=INDEX_BUILD_SCANS)
+        self.assertQueryBudget("/jj-x-stranger-things.html", 2)
+
+    def test_search(self):
+        # The sidebar lists every active brand.
+        allow_scans = INDEX_BUILD_SCANS + ("store_brand",)
+        self.assertQueryBudget("/search/?q=fossil+round", 7, allow_scans=allow_scans)
+        self.assertQueryBudget("/search/?q=vincent&shape=round&after=3", 2, allow_scans=allow_scans)
+        self.assertQueryBudget("/search/", 2, allow_scans=allow_scans)
+
+    @override_settings(STORE_SEARCH_BACKEND="fts5")
+    def test_search_fts5(self):
+        allow_scans = INDEX_BUILD_SCANS + ("store_brand",)
+        response = self.assertQueryBudget("/search/?q=fossil", 6, allow_scans=allow_scans)
+        self.assertEqual(response.context["page_obj"].paginator.count, CATALOG_SIZE // 3)
+
+    def test_product_detail(self):
+        refresh_similar_products()
+        response = self.assertQueryBudget("/product/product-1/", 4)
+        self.assertEqual(len(response.context["similar_products"]), SIMILAR_LIMIT)
+
+    def a_second_later(self):
+        # Last-Modified is withheld until the second of the last write has passed.
+        return mock.patch("store.conditional.time", **{"time_ns.return_value": time.time_ns() + 1_000_000_000})
+
+    def test_revalidation(self):
+        for url in ("/product/product-1/", "/category/eyeglasses/", "/brands/fossil.html", "/search/?q=round"):
+            with self.a_second_later():
+                response = self.client.get(url)
+                self.assertQueryBudget(url, 0, status=304, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertQueryBudget(url, 0, status=304, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+
+        etag = self.client.get("/product/product-1/")["ETag"]
+        Product.objects.filter(slug="product-2").get().save()
+        self.assertQueryBudget("/product/product-1/", 4, HTTP_IF_NONE_MATCH=etag)
+
+    def test_revalidation_after_deploy(self):
+        with self.settings(BUILD_ID="release-1"):
+            etag = self.client.get("/product/product-1/")["ETag"]
+            self.assertQueryBudget("/product/product-1/", 0, status=304, HTTP_IF_NONE_MATCH=etag)
+        with self.settings(BUILD_ID="release-2"):
+            self.assertQueryBudget("/product/product-1/", 4, HTTP_IF_NONE_MATCH=etag)
+
+    def test_last_modified_within_a_second(self):
+        self.assertNotIn("Last-Modified", self.client.get("/product/product-1/"))
+        with self.a_second_later():
+            last_modified = self.client.get("/product/product-1/")["Last-Modified"]
+        Product.objects.filter(slug="product-2").get().save()
+        self.assertQueryBudget("/product/product-1/", 4, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+    def test_revalidation_across_workers(self):
+        # Workers of one deploy start at different times but must tag pages alike.
+        with mock.patch("store.conditional.STARTED", 1):
+            etag = self.client.get("/product/product-1/")["ETag"]
+        with mock.patch("store.conditional.STARTED", 2):
+            self.assertQueryBudget("/product/product-1/", 0, status=304, HTTP_IF_NONE_MATCH=etag)
+
+    def test_cart(self):
+        session = self.client.session
+        session["cart_items"] = ["product-1", "product-2", "product-3"]
+        session["wishlist_items"] = ["product-4"]
+        session.save()
+        response = self.assertQueryBudget("/cart/", 3)
+        self.assertEqual(len(response.context["cart_items"]), 3)
+
+
+class ApiQueryBudgetTests(QueryBudgetTestCase):
+    def test_product_list(self):
+        response = self.assertQueryBudget("/api/products/", 2, allow_scans=("store_product",))
+        self.assertEqual(len(response.json()), CATALOG_SIZE)
+
+    def test_product_list_by_price(self):
+        self.assertQueryBudget("/api/products/", 2, data={"price": "750-1249"})
+
+    def test_product_list_filtered(self):
+        response = self.assertQueryBudget("/api/products/", 2, data={"brand": "fossil", "shape": ["round", "nope"]})
+        self.assertTrue(response.json())
+        self.assertEqual({product["shape"] for product in response.json()}, {"round"})
+
+    def test_product_detail(self):
+        self.assertQueryBudget(f"/api/products/{self.products[0].id}/", 2)
+
+    def test_search(self):
+        self.assertQueryBudget("/api/search/", 5, data={"q": "round"}, allow_scans=INDEX_BUILD_SCANS)
+        self.assertQueryBudget("/api/search/", 1, data={"q": "fossil", "limit": 5})
+
+    def test_suggest(self):
+        self.assertQueryBudget("/api/search/suggest/", 1, data={"q": "fo"}, allow_scans=("store_product",))
+        response = self.assertQueryBudget("/api/search/suggest/", 0, data={"q": "fos"})
+        self.assertEqual(response.json()["suggestions"][0]["label"], "Fossil")
+
+
+@override_settings(CACHES=TEST_CACHES, STORE_SEARCH_BACKEND="memory")
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog()
+        products = Product.objects.filter(category__slug="eyeglasses", is_active=True)
+        cls.listing = list(products.order_by("id").values_list("id", flat=True))
+
+    def setUp(self):
+        clear_caches()
+
+    def page(self, query=""):
+        page = self.client.get(f"/category/eyeglasses/{query}").context["page_obj"]
+        return [product.id for product in page], page
+
+    def test_after_cursors_cover_listing_once(self):
+        ids, page = self.page()
+        seen = list(ids)
+        while page.has_next():
+            ids, page = self.page(f"?after={page.next_cursor}")
+            seen.extend(ids)
+        self.assertEqual(seen, self.listing)
+
+    def test_before_cursor_returns_previous_page(self):
+        _, first = self.page()
+        _, second = self.page(f"?after={first.next_cursor}")
+        ids, page = self.page(f"?before={second.previous_cursor}")
+        self.assertEqual(ids, self.listing[:12])
+        self.assertFalse(page.has_previous())
+
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        for query in ("?after=abc", "?before=", "?page=two"):
+            ids, page = self.page(query)
+            self.assertEqual((ids, page.number), (self.listing[:12], 1), query)
+
+    def test_page_past_the_end_clamps_to_last_page(self):
+        ids, page = self.page("?page=999")
+        last = (len(self.listing) - 1) // 12
+        self.assertEqual((ids, page.number), (self.listing[last * 12 :], last + 1))
+        self.assertFalse(page.has_next())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class FacetIndexTests(TestCase):
+    """The bitset index must select and count exactly what the ORM filters it replaced would."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog()
+
+    def setUp(self):
+        clear_caches()
+        self.index = FacetIndex.build()
+        labels = [price_range.label for price_range in self.index.price_ranges]
+        self.selections = [
+            {"shape": ["round", "oval"]},
+            {"shape": ["round", "oval"], "brand": ["fossil", "air-flex"]},
+            {"color": ["Black", "Gold"], "price": [labels[0], labels[-1]]},
+            {"brand": ["fossil"], "gender": ["men", "women"], "price": labels[1:3], "size": ["wide"]},
+        ]
+
+    def filtered(self, selections):
+        products = Product.objects.all()
+        for facet, values in selections.items():
+            if facet == "price":
+                ranges = Q()
+                for label in values:
+                    low, high = (int(value) for value in label.split("-"))
+                    ranges |= Q(base_price__gte=low, base_price__lt=high + 1)
+                products = products.filter(ranges)
+            else:
+                products = products.filter(**{f"{FACET_FIELDS[facet]}__in": values})
+        return products
+
+    def test_match(self):
+        for selections in self.selections:
+            expected = list(self.filtered(selections).order_by("id").values_list("id", flat=True))
+            self.assertTrue(expected, selections)
+            self.assertEqual(self.index.ids_for(self.index.match(selections)), expected, selections)
+
+    def test_facet_counts(self):
+        base = {"category": ["eyeglasses"]}
+        base_mask = self.index.match(base)
+        for selections in self.selections:
+            counts = self.index.facet_counts(base_mask, selections)
+            for facet in ("brand", "shape", "gender", "color", "price"):
+                if facet == "price":
+                    labels = self.index.bitsets["price"]
+                    offered = [label for label in labels if self.filtered({**base, facet: [label]}).exists()]
+                else:
+                    offered = set(self.filtered(base).values_list(FACET_FIELDS[facet], flat=True))
+                others = {key: values for key, values in selections.items() if key != facet}
+                expected = {value: self.filtered({**base, **others, facet: [value]}).count() for value in offered}
+                self.assertEqual(counts[facet], expected, (facet, selections))
+
+
+class ExplainHotQueriesTests(TestCase):
+    def test_every_hot_query_uses_an_index(self):
+        out = StringIO()
+        call_command("explain_hot_queries", strict=True, plans=True, stdout=out)
+        *lines, summary = out.getvalue().splitlines()
+        # Each query's report line is followed by its indented plan.
+        plans = {}
+        name = None
+        for line in lines:
+            if line.startswith(" "):
+                plans[name].append(line.strip())
+            else:
+                status, name = line.split(None, 1)
+                self.assertEqual(status, "ok", line)
+                plans[name] = []
+        self.assertTrue(plans)
+        for name, plan in plans.items():
+            self.assertTrue(any(" USING " in line for line in plan), f"{name}: {plan}")
+        self.assertEqual(summary, f"0 of {len(plans)} hot queries scan.")
+
+
+class FilterSpecTests(SimpleTestCase):
+    def test_normalizes(self):
+        spec = FilterSpec.from_query(QueryDict("shape=round&color=Black&shape=oval&shape=round"))
+        same = FilterSpec.from_query(QueryDict("color=Black&shape=oval&shape=round&utm_source=x"))
+        self.assertEqual(spec, same)
+        self.assertEqual(hash(spec), hash(same))
+        self.assertEqual(spec.query_string, "shape=oval&shape=round&color=Black")
+
+    def test_drops_values_that_cant_match(self):
+        spec = FilterSpec.from_query(QueryDict("shape=hexagon&brand=a%27b&price=9-1&price=0-99999999&size=wide"))
+        self.assertEqual(spec.selections, (("size", ("wide",)),))
+
+    def test_rejects_invalid_values(self):
+        query = (
+            "gender=alien&weight_group=&material=" + "x" * 51 + "&color=&brand=fos+sil&brand=fossil%3B"
+            "&price=abc&price=1000&price=-5-10&frame_type=full-rim"
+        )
+        spec = FilterSpec.from_query(QueryDict(query))
+        self.assertEqual(spec.selections, (("frame_type", ("full-rim",)),))
+        self.assertEqual(FilterSpec.from_query(QueryDict("shape=hexagon&size=huge")), FilterSpec())
+
+    @override_settings(CACHES=TEST_CACHES)
+    def test_permuted_queries_share_cache_key(self):
+        queries = [
+            "price=750-1249&brand=fossil&shape=round&shape=oval&category=sunglasses",
+            "shape=oval&category=sunglasses&brand=fossil&shape=round&price=750-1249",
+            "utm_source=mail&shape=round&shape=oval&shape=round&price=750-1249&brand=fossil&category=sunglasses",
+        ]
+        keys = set()
+        for query in queries:
+            params = QueryDict(query)
+            spec = FilterSpec.from_query(params)
+            self.assertEqual(spec.query_string, "brand=fossil&shape=oval&shape=round&price=750-1249")
+            keys.add(listing_cache_context("category:eyeglasses", spec, params)["listing_key"])
+        self.assertEqual(len(keys), 1)
+
+    def test_pinned(self):
+        spec = FilterSpec.from_query(QueryDict("brand=other&shape=round"), {"brand": ["fossil"]}, pinned=("brand",))
+        self.assertEqual(spec.selected("brand"), ("fossil",))
+        self.assertEqual(spec.query_string, "shape=round")
+
+
+@override_settings(CACHES=TEST_CACHES, STORE_SEARCH_BACKEND="memory")
+class CacheInvalidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(12)
+
+    def setUp(self):
+        clear_caches()
+
+    def test_product_save_refreshes_cached_listing(self):
+        url = "/category/eyeglasses/"
+        product = Product.objects.get(slug="product-0")
+        self.assertContains(self.client.get(url), product.name)
+        self.assertNotContains(self.client.get(url, {"price": "4250-4499"}), product.name)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        product.name = "Renamed Round Frame"
+        product.base_price = 4321
+        product.save()
+        response = self.client.get(url)
+        self.assertContains(response, "Renamed Round Frame")
+        self.assertContains(response, f"Rs {product.get_display_price()}")
+        # The facet index is rebuilt too, so the new price filters.
+        self.assertContains(self.client.get(url, {"price": "4250-4499"}), "Renamed Round Frame")
+
+    def test_versions_outlive_default_cache(self):
+        bump_version()
+        version = get_version()
+        # Culling or clearing the fragment cache must not drop version keys.
+        caches["default"].clear()
+        self.assertEqual(get_version(), version)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SearchRankingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Eyeglasses", slug="eyeglasses")
+        vista = Brand.objects.create(name="Vista", slug="vista")
+        aurora = Brand.objects.create(name="Aurora Optics", slug="aurora-optics")
+        frames = [
+            ("by-material", vista, "Plain Oval", "Aurora", ""),
+            ("by-description", vista, "Classic Oval", "Acetate", "Inspired by the aurora borealis."),
+            ("by-brand", aurora, "Classic Square", "Acetate", ""),
+            ("by-name", vista, "Aurora Round", "Acetate", ""),
+        ]
+        cls.products = {
+            slug: Product.objects.create(
+                category=category,
+                brand=brand,
+                name=name,
+                slug=slug,
+                frame_material=material,
+                description=description,
+                base_price=999,
+            ).pk
+            for slug, brand, name, material, description in frames
+        }
+
+    def setUp(self):
+        clear_caches()
+
+    def ranking(self):
+        return [product_id for product_id, _ in search_ranked("aurora")]
+
+    def assertRanking(self):
+        # Descriptions aren't indexed, so a word found only there never ranks.
+        names = {product_id: slug for slug, product_id in self.products.items()}
+        self.assertEqual([names[product_id] for product_id in self.ranking()], ["by-name", "by-brand", "by-material"])
+
+    def test_memory_backend(self):
+        with self.settings(STORE_SEARCH_BACKEND="memory"):
+            self.assertRanking()
+
+    def test_fts5_backend(self):
+        with self.settings(STORE_SEARCH_BACKEND="fts5"):
+            self.assertRanking()
+
+
+class PriceBucketTests(SimpleTestCase):
+    def test_empty_catalog(self):
+        self.assertEqual(derive_ranges([]), [])
+
+    def test_single_price(self):
+        (price_range,) = derive_ranges([(4, 3, Decimal("1099"), Decimal("1099"))])
+        self.assertEqual(price_range, PriceRange("1000-1249", (4,), Decimal("1099"), Decimal("1099"), 3))
+        self.assertEqual(buckets_for(price_range.label), price_range.buckets)
+
+    def test_ranges_split_products_evenly(self):
+        histogram = [(bucket, 1, Decimal(bucket * 250), Decimal(bucket * 250 + 99)) for bucket in range(10)]
+        ranges = derive_ranges(histogram)
+        self.assertEqual([price_range.buckets for price_range in ranges], [(0, 1), (2, 3), (4, 5), (6, 7), (8, 9)])
+        self.assertEqual(ranges[1].label, "500-999")
+        self.assertEqual((ranges[1].min_price, ranges[1].max_price, ranges[1].count), (500, 849, 2))
+
+    def test_bucket_edges(self):
+        self.assertEqual(buckets_for("0-249"), (0,))
+        self.assertEqual(buckets_for("1000-1249"), (4,))
+        self.assertEqual(buckets_for("1000-1250"), (4, 5))
+        self.assertEqual(buckets_for("999-1000"), (3, 4))
+        self.assertEqual(buckets_for("1250-1250"), (5,))
+
+    def test_rejects_labels(self):
+        for label in ("", "1000", "abc-def", "1249-1000", "-250-0", None):
+            self.assertEqual(buckets_for(label), (), label)
+
+    def test_max_range_buckets(self):
+        widest = f"0-{MAX_RANGE_BUCKETS * 250 - 1}"
+        self.assertEqual(len(buckets_for(widest)), MAX_RANGE_BUCKETS)
+        self.assertEqual(buckets_for(f"0-{MAX_RANGE_BUCKETS * 250}"), ())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PromoMembershipTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(12)
+        cls.collection = PromoCollection.objects.create(slug="aurora", title="Aurora", keyword="aurora")
+
+    def members(self):
+        return set(self.collection.products.values_list("slug", flat=True))
+
+    def test_brand_rename_moves_only_its_products(self):
+        self.assertEqual(self.members(), set())
+        brand = Brand.objects.get(slug="fossil")
+        brand.name = "Aurora Fossil"
+        brand.save()
+        self.assertEqual(self.members(), set(brand.products.values_list("slug", flat=True)))
+
+        category = Category.objects.get(slug="sunglasses")
+        category.name = "Aurora Sunglasses"
+        category.save()
+        self.assertEqual(
+            self.members(),
+            set(Product.objects.filter(Q(brand=brand) | Q(category=category)).values_list("slug", flat=True)),
+        )
+
+    def test_other_brand_saves_leave_memberships_alone(self):
+        brand = Brand.objects.get(slug="fossil")
+        brand.active = False
+        with CaptureQueriesContext(connection) as context:
+            brand.save()
+        self.assertFalse([query for query in context.captured_queries if "promocollection" in query["sql"]])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BrandSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(12)
+
+    def summary(self, slug):
+        return BrandSummary.objects.get(brand__slug=slug)
+
+    def test_follows_product_writes(self):
+        product = Product.objects.get(slug="product-0")
+        self.assertEqual(product.brand.slug, "vincent-chase")
+        before = self.summary("fossil").product_count
+
+        product.brand = Brand.objects.get(slug="fossil")
+        product.base_price = 499
+        product.save()
+        fossil = self.summary("fossil")
+        self.assertEqual((fossil.product_count, fossil.min_price), (before + 1, 499))
+        self.assertEqual(self.summary("vincent-chase").product_count, 3)
+
+        product.delete()
+        self.assertEqual(self.summary("fossil").product_count, before)
+
+    def test_new_brand(self):
+        Brand.objects.create(name="Lenskart Air", slug="lenskart-air")
+        self.assertEqual(self.summary("lenskart-air").product_count, 0)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SimilarProductTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(30)
+
+    def links(self):
+        # Scores are float32 dot products; their last bits depend on how a run
+        # blocked the matrix product.
+        links = SimilarProduct.objects.order_by("product_id", "rank").values_list("product_id", "score")
+        return [(product_id, round(score, 4)) for product_id, score in links]
+
+    def test_neighbours_stay_in_category(self):
+        refresh_similar_products()
+        for link in SimilarProduct.objects.select_related("product", "similar"):
+            self.assertEqual(link.product.category_id, link.similar.category_id)
+            self.assertNotEqual(link.product_id, link.similar_id)
+
+    def test_incremental_matches_full(self):
+        self.assertEqual(refresh_similar_products(), 30)
+        self.assertEqual(refresh_similar_products(), 0)
+
+        product = Product.objects.get(slug="product-4")
+        product.shape = "aviator"
+        product.base_price = 4999
+        product.save()
+        Product.objects.get(slug="product-7").delete()
+        Product.objects.filter(slug="product-9").update(is_active=False)
+        self.assertLess(refresh_similar_products(), 28)
+        incremental = self.links()
+
+        refresh_similar_products(full=True)
+        self.assertEqual(incremental, self.links())
+
+
+class RenditionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root, CACHES=TEST_CACHES)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def upload(self, size=(1200, 800)):
+        buffer = BytesIO()
+        Image.new("RGBA", size, (20, 40, 60, 128)).save(buffer, "PNG")
+        return SimpleUploadedFile("frame.png", buffer.getvalue(), content_type="image/png")
+
+    def test_worker_renders_queued_uploads(self):
+        category = Category.objects.create(name="Eyeglasses", slug="eyeglasses")
+        product = Product.objects.create(name="Frame", slug="frame", category=category, base_price=999)
+        image = ProductImage.objects.create(product=product, image=self.upload(), is_primary=True)
+        ProductImage.objects.create(product=product, image=self.upload())
+        image.refresh_from_db()
+        self.assertRegex(image.image_hash, r"^[0-9a-f]{64}$")
+        product.refresh_from_db()
+        self.assertEqual(product.primary_image_hash, image.image_hash)
+        # Both uploads have the same content, so share one job.
+        self.assertEqual(list(RenditionJob.objects.values_list("digest", "status")), [(image.image_hash, "pending")])
+
+        with rendition_pool(2) as pool:
+            self.assertEqual(run_worker(pool, 2, once=True), {"done": 1})
+        for rendition, width in RENDITIONS.items():
+            for extension in ("webp", "jpg"):
+                with default_storage.open(rendition_name(image.image_hash, rendition, extension)) as file:
+                    self.assertEqual(Image.open(file).width, min(width, 1200))
+
+        first_hash = image.image_hash
+        image.image = self.upload((500, 500))
+        image.save()
+        image.refresh_from_db()
+        product.refresh_from_db()
+        self.assertNotEqual(image.image_hash, first_hash)
+        self.assertEqual(product.primary_image_hash, image.image_hash)
+        self.assertEqual(RenditionJob.objects.get(digest=image.image_hash).status, "pending")
+
+    def test_upload_is_described(self):
+        category = Category.objects.create(name="Eyeglasses", slug="eyeglasses")
+        product = Product.objects.create(name="Frame", slug="frame", category=category, base_price=999)
+        image = ProductImage.objects.create(product=product, image=self.upload((600, 300)), is_primary=True)
+        image.refresh_from_db()
+        self.assertEqual((image.image_width, image.image_height), (600, 300))
+        self.assertRegex(image.image_color, r"^#[0-9a-f]{6}$")
+        self.assertTrue(image.image_placeholder.startswith("data:image/webp;base64,"))
+
+        product.refresh_from_db()
+        card = product.get_primary_image()
+        self.assertEqual((card.image_width, card.image_placeholder), (600, image.image_placeholder))
+        html = Template("{% load store_images %}{% picture card %}").render(Context({"card": card}))
+        self.assertIn("aspect-ratio: 600 / 300", html)
+        # Only renditions up to the original's width are offered.
+        self.assertIn(f"{rendition_name(image.image_hash, 'detail', 'webp')} 600w", html)
+        self.assertNotIn("zoom.webp", html)
+
+    def test_uploads_stored_once_by_content(self):
+        category = Category.objects.create(name="Eyeglasses", slug="eyeglasses", image=self.upload())
+        banner = Banner.objects.create(title="Sale", image=self.upload())
+        self.assertEqual(category.image.name, banner.image.name)
+        self.assertEqual(banner.image.name, f"originals/{banner.image_hash[:2]}/{banner.image_hash}.png")
+        card = rendition_name(banner.image_hash, "card", "webp")
+        self.client.get(default_storage.url(card))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category.delete()
+        self.assertTrue(default_storage.exists(banner.image.name))
+        self.age(banner.image.name)
+        with self.captureOnCommitCallbacks(execute=True):
+            banner.image = self.upload((300, 200))
+            banner.save()
+        self.assertFalse(default_storage.exists(category.image.name))
+        self.assertFalse(default_storage.exists(card))
+
+    def age(self, name):
+        # As if saved before RELEASE_GRACE.
+        saved = time.time() - RELEASE_GRACE.total_seconds() - 60
+        os.utime(content_storage.path(name), (saved, saved))
+
+    def test_concurrent_save_keeps_content_name(self):
+        name = content_storage.save("frame.png", self.upload())
+        # The loser of a race finds no file, then fails to link over the winner's.
+        with mock.patch("store.storage.os.path.exists", return_value=False):
+            self.assertEqual(content_storage.save("other.png", self.upload()), name)
+        self.assertEqual(os.listdir(os.path.dirname(content_storage.path(name))), [os.path.basename(name)])
+
+    def test_release_keeps_file_found_by_uncommitted_upload(self):
+        banner = Banner.objects.create(title="Sale", image=self.upload())
+        name = banner.image.name
+        self.age(name)
+        # A second upload of the same content finds the file in place; its row isn't committed yet.
+        self.assertEqual(content_storage.save("frame.png", self.upload()), name)
+        with self.captureOnCommitCallbacks(execute=True):
+            banner.image = self.upload((300, 200))
+            banner.save()
+        self.assertTrue(default_storage.exists(name))
+        # The upload commits, and its file is still there to describe.
+        category = Category.objects.create(name="Eyeglasses", slug="eyeglasses", image=name)
+        category.refresh_from_db()
+        self.assertEqual(category.image_width, 1200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category.delete()
+        self.age(name)
+        call_command("prune_media", stdout=StringIO())
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(banner.image.name))
+
+    def test_dedupe_media_stores_identical_files_once(self):
+        content = self.upload().read()
+        for name in ("banners/hero.png", "products/front.png"):
+            default_storage.save(name, ContentFile(content))
+        banner = Banner.objects.create(title="Sale", image="banners/hero.png")
+        category = Category.objects.create(name="Eyeglasses", slug="eyeglasses")
+        product = Product.objects.create(name="Frame", slug="frame", category=category, base_price=999)
+        image = ProductImage.objects.create(product=product, image="products/front.png", is_primary=True)
+
+        call_command("dedupe_media", processes=1, stdout=StringIO())
+        for instance in (banner, image, product):
+            instance.refresh_from_db()
+        stored = f"originals/{banner.image_hash[:2]}/{banner.image_hash}.png"
+        self.assertEqual((banner.image.name, image.image.name, product.primary_image), (stored,) * 3)
+        self.assertEqual(image.image_hash, banner.image_hash)
+        self.assertEqual(product.primary_image_hash, banner.image_hash)
+        self.assertTrue(default_storage.exists(stored))
+        self.assertFalse(default_storage.exists("banners/hero.png"))
+        self.assertFalse(default_storage.exists("products/front.png"))
+
+    def test_unreadable_image_is_retried(self):
+        banner = Banner.objects.create(title="Sale", image=self.upload())
+        with default_storage.open(banner.image.name, "wb") as file:
+            file.write(b"not an image")
+        with rendition_pool(1) as pool:
+            self.assertEqual(run_worker(pool, 1, once=True), {"retried": 1})
+        job = RenditionJob.objects.get(digest=banner.image_hash)
+        self.assertEqual((job.status, job.attempts), ("pending", 1))
+        self.assertIn("UnidentifiedImageError", job.last_error)
+
+    def test_missing_rendition_is_rendered_on_request(self):
+        banner = Banner.objects.create(title="Sale", image=self.upload())
+        name = rendition_name(banner.image_hash, "card", "webp")
+        default_storage.delete(name)
+
+        response = self.client.get(default_storage.url(name))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertTrue(default_storage.exists(name))
+
+        missing = rendition_name("0" * 64, "card", "webp")
+        self.assertEqual(self.client.get(default_storage.url(missing)).status_code, 404)
+
+
+class SeedFromMediaTests(TestCase):
+    def setUp(self):
+        self.base_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.base_dir)
+        media = self.base_dir / "media"
+        for folder, count in (("products", 5), ("categories", 2), ("brands", 1), ("banners", 1)):
+            (media / folder).mkdir(parents=True)
+            for index in range(count):
+                Image.new("RGB", (80, 60), (index * 40, 90, 160)).save(media / folder / f"{index}.jpg")
+        settings = override_settings(BASE_DIR=self.base_dir, MEDIA_ROOT=media, CACHES=TEST_CACHES)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def seed(self):
+        call_command("seed_from_media", processes=1, stdout=StringIO())
+
+    def test_seeds_catalog_in_bulk(self):
+        self.seed()
+        product = Product.objects.get(slug="product-3")
+        self.assertEqual(product.primary_image, "products/2.jpg")
+        self.assertEqual(product.primary_image_width, 80)
+        self.assertRegex(product.primary_image_hash, r"^[0-9a-f]{64}$")
+        self.assertEqual(BrandSummary.objects.get(brand=product.brand).product_count, 1)
+        # The first image of each folder has the same content, rendered once.
+        self.assertEqual(RenditionJob.objects.count(), 5)
+
+        # Reruns add only what is missing.
+        Image.new("RGB", (80, 60)).save(self.base_dir / "media" / "products" / "5.jpg")
+        self.seed()
+        self.assertEqual(Product.objects.count(), 6)
+        self.assertEqual(ProductImage.objects.count(), 6)
+        self.assertEqual(Category.objects.count(), 6)
+        self.assertEqual(Banner.objects.count(), 1)
+
+    def test_clear_skips_delete_signals(self):
+        self.seed()
+        refresh_similar_products()
+        version = get_version()
+        deleted = []
+
+        def receiver(sender, **kwargs):
+            deleted.append(sender)
+
+        post_delete.connect(receiver)
+        self.addCleanup(post_delete.disconnect, receiver)
+
+        call_command("seed_from_media", clear=True, processes=1, stdout=StringIO())
+        # Only refresh_brand_summaries' own rebuild deletes row by row.
+        self.assertEqual(set(deleted), {BrandSummary})
+        self.assertEqual(Product.objects.count(), 5)
+        self.assertEqual(Category.objects.count(), 6)
+        self.assertFalse(SimilarProduct.objects.exists())
+        self.assertEqual(BrandSummary.objects.get(brand__slug="fossil").product_count, 1)
+        self.assertGreater(get_version(), version)
+
+    def test_skips_dotfiles(self):
+        for folder in ("products", "banners"):
+            (self.base_dir / "media" / folder / ".DS_Store").write_bytes(b"\0\0\0\1Bud1")
+        self.seed()
+        self.assertEqual(Product.objects.count(), 5)
+        self.assertFalse(ProductImage.objects.filter(image__contains=".DS_Store").exists())
+        self.assertEqual(Banner.objects.count(), 1)
+
+
+class MediaServingTests(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root, SERVE_MEDIA_FILES=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.body = bytes(range(256)) * 4
+        default_storage.save("banners/sale.jpg", ContentFile(self.body))
+
+    def test_revalidation_and_cache_headers(self):
+        response = self.client.get("/media/banners/sale.jpg")
+        self.assertEqual(b"".join(response.streaming_content), self.body)
+        self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        response = self.client.get("/media/banners/sale.jpg", headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+        hashed = default_storage.save("originals/ab/" + "ab" * 32 + ".jpg", ContentFile(self.body))
+        self.assertIn("immutable", self.client.get(f"/media/{hashed}")["Cache-Control"])
+        self.assertEqual(self.client.get("/media/banners/missing.jpg").status_code, 404)
+        self.assertEqual(self.client.get("/media/../settings.py").status_code, 404)
+
+    def test_byte_ranges(self):
+        response = self.client.get("/media/banners/sale.jpg", headers={"Range": "bytes=10-19"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 10-19/1024")
+        self.assertEqual(b"".join(response.streaming_content), self.body[10:20])
+
+        response = self.client.get("/media/banners/sale.jpg", headers={"Range": "bytes=-4"})
+        self.assertEqual(b"".join(response.streaming_content), self.body[-4:])
+        response = self.client.get("/media/banners/sale.jpg", headers={"Range": "bytes=2048-"})
+        self.assertEqual((response.status_code, response["Content-Range"]), (416, "bytes */1024"))
+        response = self.client.get("/media/banners/sale.jpg", headers={"Range": "bytes=0-1", "If-Range": '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(MEDIA_SENDFILE="x-accel-redirect")
+    def test_delegates_to_proxy(self):
+        response = self.client.get("/media/banners/sale.jpg")
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/banners/sale.jpg")
+        self.assertEqual(response.content, b"")
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
@@ -8,11 +9,14 @@ from .api_views import (
     ProductImageViewSet,
     ProductViewSet,
 )
+from .media_views import rendition_view
 from .views import (
     home_view,
     category_view,
     product_detail_view,
     product_search_view,
+    product_search_api_view,
+    search_suggest_view,
     shape_gender_view,
     around_view,
     home_eye_test_view,
@@ -60,5 +64,12 @@ urlpatterns = [
     path('air-x.html', promo_air_x_view, name='promo_air_x'),
     path('transparents-eyeglasses.html', promo_transparent_view, name='promo_transparent'),
     path('api/pincode-check/', pincode_check_view, name='pincode_check'),
+    path('api/search/', product_search_api_view, name='product_search_api'),
+    path('api/search/suggest/', search_suggest_view, name='search_suggest'),
     path('api/', include(router.urls)),
+    path(
+        f"{settings.MEDIA_URL.lstrip('/')}renditions/<str:prefix>/<str:digest>/<slug:rendition>.<slug:extension>",
+        rendition_view,
+        name='rendition',
+    ),
 ]
@@ -4,58 +4,40 @@ import re
 from datetime import timedelta
 from pathlib import Path
 from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
 from urllib.request import Request, urlopen
 import ssl
 
 from django.conf import settings
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, render
-from django.core.paginator import Paginator
-from django.db.models import Min, Q
+from django.urls import reverse
 from django.utils import timezone
-from .models import Banner, Brand, Category, DeliveryPincode, Product, HtoAddress
+from .conditional import catalog_conditional
+from .facet_index import ProductIdList
+from .filter_spec import FilterSpec, compile_listing
+from .home import get_home_snapshot
+from .listing_cache import cached_lookup, lazy_context, listing_cache_context
+from .models import (
+    Brand,
+    BrandSummary,
+    Category,
+    DeliveryPincode,
+    HtoAddress,
+    Product,
+    PromoCollection,
+    SimilarProduct,
+)
+from .pagination import KeysetPaginator
+from .search import search_products
+from .search.suggest import SUGGESTION_LIMIT, get_suggestion_trie
 
 
 def home_view(request):
-    banners = Banner.objects.filter(active=True, banner_type='hero').order_by('order')[:5]
-    categories = Category.objects.filter(active=True)
-    trending_products = Product.objects.filter(is_active=True, is_trending=True).order_by('-created_at')[:12]
-    premium_products = Product.objects.filter(is_active=True, is_premium=True).order_by('-created_at')[:12]
-    exclusive_products = Product.objects.filter(is_active=True, is_exclusive=True).order_by('-created_at')[:12]
-    brand_cards = (
-        Brand.objects.filter(active=True, products__is_active=True)
-        .annotate(min_price=Min("products__base_price"))
-        .distinct()
-    )
-    coupon_banner = Banner.objects.filter(active=True, banner_type='coupon').order_by('order').first()
-    replacement_banner = Banner.objects.filter(active=True, banner_type='replacement').order_by('order').first()
-    buy1get1_banner = Banner.objects.filter(active=True, banner_type='buy1get1').order_by('order').first()
-    exclusive_banner = Banner.objects.filter(active=True, banner_type='exclusive').order_by('order').first()
-    exclusive_banners = Banner.objects.filter(active=True, banner_type='exclusive').order_by('order')
-    premium_banner = Banner.objects.filter(active=True, banner_type='premium').order_by('order').first()
-    special_banners = [banner for banner in (coupon_banner, replacement_banner, buy1get1_banner) if banner]
-
-    fossil_products_qs = Product.objects.filter(is_active=True, brand__slug='fossil').order_by('-created_at')
-    fossil_products = list(fossil_products_qs[:8])
-    if not fossil_products:
-        fossil_products = list(Product.objects.filter(is_active=True).order_by('-created_at')[:8])
+    return render(request, 'store/home.html', get_home_snapshot().as_context())
 
-    context = {
-        'banners': banners,
-        'categories': categories,
-        'trending_products': trending_products,
-        'premium_products': premium_products,
-        'exclusive_products': exclusive_products,
-        'brand_cards': brand_cards,
-        'special_banners': special_banners,
-        'exclusive_banner': exclusive_banner,
-        'exclusive_banners': exclusive_banners,
-        'premium_banner': premium_banner,
-        'fossil_products': fossil_products,
-        'shape_choices': Product.SHAPE_CHOICES,
-    }
-    return render(request, 'store/home.html', context)
 
+SEARCH_API_MAX_LIMIT = 50
 
 PINCODE_RE = re.compile(r"^[1-9][0-9]{5}$")
 
@@ -178,263 +160,105 @@ def pincode_check_view(request):
     return JsonResponse(_pincode_payload(record))
 
 
-def _build_filtered_products(request, base_products, fixed_shapes=None, fixed_genders=None):
-    filter_base = base_products
-
-    price_ranges = [
-        ("1500-1999", 1500, 1999),
-        ("2500-2999", 2500, 2999),
-        ("3500-3999", 3500, 3999),
-        ("4500-4999", 4500, 4999),
-        ("6500-6999", 6500, 6999),
-    ]
-
-    selected_brands = request.GET.getlist("brand")
-    selected_shapes = request.GET.getlist("shape")
-    selected_frame_types = request.GET.getlist("frame_type")
-    selected_colors = request.GET.getlist("color")
-    selected_sizes = request.GET.getlist("size")
-    selected_prices = request.GET.getlist("price")
-    selected_genders = request.GET.getlist("gender")
-    selected_materials = request.GET.getlist("material")
-    selected_weights = request.GET.getlist("weight_group")
-
-    if fixed_shapes:
-        selected_shapes = list(fixed_shapes)
-    if fixed_genders:
-        selected_genders = list(fixed_genders)
-
-    products = filter_base
-    if selected_brands:
-        products = products.filter(brand__slug__in=selected_brands)
-    if selected_shapes:
-        products = products.filter(shape__in=selected_shapes)
-    if selected_frame_types:
-        products = products.filter(frame_type__in=selected_frame_types)
-    if selected_genders:
-        products = products.filter(gender__in=selected_genders)
-    if selected_materials:
-        products = products.filter(frame_material__in=selected_materials)
-    if selected_colors:
-        products = products.filter(color__in=selected_colors)
-    if selected_sizes:
-        products = products.filter(size__in=selected_sizes)
-    if selected_weights:
-        products = products.filter(weight_group__in=selected_weights)
-    if selected_prices:
-        price_q = Q()
-        for key in selected_prices:
-            for label, min_price, max_price in price_ranges:
-                if key == label:
-                    price_q |= Q(base_price__gte=min_price, base_price__lte=max_price)
-        if price_q:
-            products = products.filter(price_q)
-
-    products = products.order_by("id")
-
-    products = products.order_by("id")
-
-    available_shapes = set(filter_base.values_list("shape", flat=True))
-    available_frame_types = set(filter_base.values_list("frame_type", flat=True))
-    available_genders = set(filter_base.values_list("gender", flat=True))
-    available_materials = sorted(
-        {value for value in filter_base.values_list("frame_material", flat=True) if value}
-    )
-    available_colors = sorted({value for value in filter_base.values_list("color", flat=True) if value})
-    available_sizes = set(filter_base.values_list("size", flat=True))
-    available_weights = set(filter_base.values_list("weight_group", flat=True))
-
-    shape_choices = [(value, label) for value, label in Product.SHAPE_CHOICES if value in available_shapes]
-    frame_type_choices = [
-        (value, label) for value, label in Product.FRAME_TYPE_CHOICES if value in available_frame_types
-    ]
-    gender_choices = [(value, label) for value, label in Product.GENDER_CHOICES if value in available_genders]
-    size_choices = [
-        (value, label)
-        for value, label in Product.SIZE_CHOICES
-        if value in available_sizes
-    ]
-    weight_choices = [
-        (value, label)
-        for value, label in Product.WEIGHT_CHOICES
-        if value in available_weights
-    ]
-    brands = Brand.objects.filter(active=True, products__in=filter_base).distinct()
-
-    filter_params = request.GET.copy()
-    filter_params.pop("page", None)
-
-    context = {
-        "brands": brands,
-        "shape_choices": shape_choices,
-        "frame_type_choices": frame_type_choices,
-        "gender_choices": gender_choices,
-        "material_choices": available_materials,
-        "color_choices": available_colors,
-        "size_choices": size_choices,
-        "weight_choices": weight_choices,
-        "price_choices": price_ranges,
-        "selected_brands": selected_brands,
-        "selected_shapes": selected_shapes,
-        "selected_frame_types": selected_frame_types,
-        "selected_genders": selected_genders,
-        "selected_materials": selected_materials,
-        "selected_colors": selected_colors,
-        "selected_sizes": selected_sizes,
-        "selected_weights": selected_weights,
-        "selected_prices": selected_prices,
-        "filter_query": filter_params.urlencode(),
-    }
-    return products, context
-
-
+# Template variable holding each facet's selected values.
+SELECTED_KEYS = {
+    "brand": "selected_brands",
+    "shape": "selected_shapes",
+    "frame_type": "selected_frame_types",
+    "gender": "selected_genders",
+    "material": "selected_materials",
+    "color": "selected_colors",
+    "size": "selected_sizes",
+    "weight_group": "selected_weights",
+    "price": "selected_prices",
+}
+
+LISTING_CONTEXT_KEYS = (
+    "page_obj",
+    "brands",
+    "shape_choices",
+    "frame_type_choices",
+    "gender_choices",
+    "material_choices",
+    "color_choices",
+    "size_choices",
+    "weight_choices",
+    "price_choices",
+    *SELECTED_KEYS.values(),
+)
+
+
+def _listing_context(request, cache_name, base_facets, pinned=()):
+    spec = FilterSpec.from_query(request.GET, base_facets, pinned)
+
+    # Products and facets are only computed when a cached fragment misses.
+    def build():
+        plan = compile_listing(spec)
+        context = dict(plan.choices)
+        context.update({key: spec.selected(facet) for facet, key in SELECTED_KEYS.items()})
+        context["page_obj"] = KeysetPaginator(ProductIdList(plan.ids), 12).get_page(request.GET)
+        return context
+
+    context = lazy_context(build, LISTING_CONTEXT_KEYS)
+    context.update(listing_cache_context(cache_name, spec, request.GET))
+    return context
+
+
+@catalog_conditional
 def category_view(request, slug):
-    category = get_object_or_404(Category, slug=slug, active=True)
-
-    products = category.products.filter(is_active=True)
-    filter_base = products
-
-    price_ranges = [
-        ("1500-1999", 1500, 1999),
-        ("2500-2999", 2500, 2999),
-        ("3500-3999", 3500, 3999),
-        ("4500-4999", 4500, 4999),
-        ("6500-6999", 6500, 6999),
-    ]
-
-    selected_brands = request.GET.getlist("brand")
-    selected_shapes = request.GET.getlist("shape")
-    selected_frame_types = request.GET.getlist("frame_type")
-    selected_colors = request.GET.getlist("color")
-    selected_sizes = request.GET.getlist("size")
-    selected_prices = request.GET.getlist("price")
-    selected_genders = request.GET.getlist("gender")
-    selected_materials = request.GET.getlist("material")
-    selected_weights = request.GET.getlist("weight_group")
-
-    if selected_brands:
-        products = products.filter(brand__slug__in=selected_brands)
-    if selected_shapes:
-        products = products.filter(shape__in=selected_shapes)
-    if selected_frame_types:
-        products = products.filter(frame_type__in=selected_frame_types)
-    if selected_genders:
-        products = products.filter(gender__in=selected_genders)
-    if selected_materials:
-        products = products.filter(frame_material__in=selected_materials)
-    if selected_colors:
-        products = products.filter(color__in=selected_colors)
-    if selected_sizes:
-        products = products.filter(size__in=selected_sizes)
-    if selected_weights:
-        products = products.filter(weight_group__in=selected_weights)
-    if selected_prices:
-        price_q = Q()
-        for key in selected_prices:
-            for label, min_price, max_price in price_ranges:
-                if key == label:
-                    price_q |= Q(base_price__gte=min_price, base_price__lte=max_price)
-        if price_q:
-            products = products.filter(price_q)
-
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-
-    available_shapes = set(filter_base.values_list("shape", flat=True))
-    available_frame_types = set(filter_base.values_list("frame_type", flat=True))
-    available_genders = set(filter_base.values_list("gender", flat=True))
-    available_materials = sorted(
-        {value for value in filter_base.values_list("frame_material", flat=True) if value}
-    )
-    available_colors = sorted({value for value in filter_base.values_list("color", flat=True) if value})
-    available_sizes = set(filter_base.values_list("size", flat=True))
-    available_weights = set(filter_base.values_list("weight_group", flat=True))
-
-    shape_choices = [(value, label) for value, label in Product.SHAPE_CHOICES if value in available_shapes]
-    frame_type_choices = [
-        (value, label) for value, label in Product.FRAME_TYPE_CHOICES if value in available_frame_types
-    ]
-    gender_choices = [(value, label) for value, label in Product.GENDER_CHOICES if value in available_genders]
-    size_choices = [
-        (value, label)
-        for value, label in Product.SIZE_CHOICES
-        if value in available_sizes
-    ]
-    weight_choices = [
-        (value, label)
-        for value, label in Product.WEIGHT_CHOICES
-        if value in available_weights
-    ]
-    brands = Brand.objects.filter(active=True, products__in=filter_base).distinct()
-
-    filter_params = request.GET.copy()
-    filter_params.pop("page", None)
+    category = cached_lookup(Category, slug=slug, active=True)
+    if category is None:
+        raise Http404("No Category matches the given query.")
 
     context = {
         'category': category,
-        'page_obj': page_obj,
-        'brands': brands,
-        'shape_choices': shape_choices,
-        'frame_type_choices': frame_type_choices,
-        'gender_choices': gender_choices,
-        'material_choices': available_materials,
-        'color_choices': available_colors,
-        'size_choices': size_choices,
-        'weight_choices': weight_choices,
-        'price_choices': price_ranges,
-        'selected_brands': selected_brands,
-        'selected_shapes': selected_shapes,
-        'selected_frame_types': selected_frame_types,
-        'selected_genders': selected_genders,
-        'selected_materials': selected_materials,
-        'selected_colors': selected_colors,
-        'selected_sizes': selected_sizes,
-        'selected_weights': selected_weights,
-        'selected_prices': selected_prices,
-        'filter_query': filter_params.urlencode(),
     }
+    context.update(_listing_context(request, f"category:{category.slug}", {"category": [category.slug]}))
     return render(request, 'store/category.html', context)
 
 
+@catalog_conditional
 def product_detail_view(request, slug):
     product = get_object_or_404(Product, slug=slug, is_active=True)
     product_images = product.images.all()
+    similar_links = (
+        SimilarProduct.objects.filter(product=product, similar__is_active=True)
+        .select_related('similar__brand')
+        .order_by('rank')
+    )
 
     context = {
         'product': product,
         'product_images': product_images,
+        'similar_products': [link.similar for link in similar_links],
     }
     return render(request, 'store/product_detail.html', context)
 
 
+@catalog_conditional
 def shape_gender_view(request, shape, gender):
     category_slug = request.GET.get("category")
-    base_products = Product.objects.filter(is_active=True, shape=shape, gender=gender)
+    base_facets = {"shape": [shape], "gender": [gender]}
     if category_slug:
-        base_products = base_products.filter(category__slug=category_slug)
-    products, filter_context = _build_filtered_products(
+        base_facets["category"] = [category_slug]
+    listing_context = _listing_context(
         request,
-        base_products,
-        fixed_shapes=[shape],
-        fixed_genders=[gender],
+        f"shape:{shape}:{gender}",
+        base_facets,
+        pinned=("shape", "gender"),
     )
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
 
     shape_label = dict(Product.SHAPE_CHOICES).get(shape, shape)
     gender_label = dict(Product.GENDER_CHOICES).get(gender, gender)
     category = None
     if category_slug:
-        category = Category.objects.filter(slug=category_slug, active=True).first()
+        category = cached_lookup(Category, slug=category_slug, active=True)
     if not category:
-        category = Category.objects.filter(slug="eyeglasses", active=True).first()
+        category = cached_lookup(Category, slug="eyeglasses", active=True)
     category_label = category.name if category else "Eyeglasses"
 
     context = {
         "category": category,
-        "page_obj": page_obj,
         "page_title": f"{shape_label} {category_label} for {gender_label}",
         "category_label": category_label,
         "shape_label": shape_label,
@@ -443,56 +267,79 @@ def shape_gender_view(request, shape, gender):
         "gender_value": gender,
         "tryon_enabled": request.GET.get("tryon") == "1",
     }
-    context.update(filter_context)
+    context.update(listing_context)
     return render(request, "store/shape_listing.html", context)
 
 
-def product_search_view(request):
+def _search_request(request):
     query = request.GET.get('q', '').strip()
-    products = Product.objects.filter(is_active=True)
-
-    if query:
-        terms = [term for term in query.split() if term]
-        query_q = Q()
-        for term in terms:
-            query_q |= Q(name__icontains=term)
-            query_q |= Q(brand__name__icontains=term)
-            query_q |= Q(category__name__icontains=term)
-            query_q |= Q(shape__icontains=term)
-            query_q |= Q(gender__icontains=term)
-            query_q |= Q(frame_type__icontains=term)
-            query_q |= Q(frame_material__icontains=term)
-            query_q |= Q(color__icontains=term)
-        products = products.filter(query_q)
-
-    brand_slug = request.GET.get("brand")
-    shape = request.GET.get("shape")
-    gender = request.GET.get("gender")
-    if brand_slug:
-        products = products.filter(brand__slug=brand_slug)
-    if shape:
-        products = products.filter(shape=shape)
-    if gender:
-        products = products.filter(gender=gender)
-
-    products = products.order_by("id")
-
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    spec = FilterSpec.from_query(request.GET)
+    # The search form offers one brand, shape and gender.
+    filters = {key: next(iter(spec.selected(key)), "") for key in ("brand", "shape", "gender")}
+    products, scores = search_products(query, {key: [value] for key, value in filters.items() if value})
+    return query, filters, products, scores
+
+
+@catalog_conditional
+def product_search_view(request):
+    query, filters, products, _ = _search_request(request)
+    search_query = urlencode({"q": query, **filters})
+    page_obj = KeysetPaginator(products, 12).get_page(request.GET)
 
     context = {
         'query': query,
+        'search_query': search_query,
         'page_obj': page_obj,
         'brands': Brand.objects.filter(active=True),
-        'selected_brand': brand_slug,
-        'selected_shape': shape,
-        'selected_gender': gender,
+        'selected_brand': filters["brand"] or None,
+        'selected_shape': filters["shape"] or None,
+        'selected_gender': filters["gender"] or None,
         'shape_choices': Product.SHAPE_CHOICES,
     }
     return render(request, 'store/search_results.html', context)
 
 
+def product_search_api_view(request):
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed."}, status=405)
+
+    try:
+        limit = min(max(int(request.GET.get("limit", 20)), 1), SEARCH_API_MAX_LIMIT)
+        offset = max(int(request.GET.get("offset", 0)), 0)
+    except ValueError:
+        return JsonResponse({"error": "limit and offset must be integers."}, status=400)
+
+    query, _, products, scores = _search_request(request)
+    results = []
+    for product in products[offset : offset + limit]:
+        image = product.get_primary_image()
+        results.append({
+            "id": product.id,
+            "name": product.name,
+            "slug": product.slug,
+            "url": reverse("product_detail", args=[product.slug]),
+            "brand": product.brand.name if product.brand else None,
+            "base_price": product.base_price,
+            "image": image.image.url if image else None,
+            "score": round(scores[product.id], 4) if product.id in scores else None,
+        })
+    return JsonResponse({"query": query, "count": len(products), "results": results})
+
+
+def search_suggest_view(request):
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed."}, status=405)
+
+    try:
+        limit = min(max(int(request.GET.get("limit", SUGGESTION_LIMIT)), 1), SUGGESTION_LIMIT)
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer."}, status=400)
+
+    query = request.GET.get("q", "")
+    suggestions = get_suggestion_trie().suggest(query, limit)
+    return JsonResponse({"query": query, "suggestions": [suggestion._asdict() for suggestion in suggestions]})
+
+
 def cart_view(request):
     return HttpResponse("Cart page coming soon!")
 
@@ -542,72 +389,49 @@ def hto_confirm_view(request):
 
 
 def promo_jj_stranger_things_view(request):
-    base_products = Product.objects.filter(is_active=True)
-    products, filter_context = _build_filtered_products(request, base_products)
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-
-    context = {
-        "page_obj": page_obj,
-        "page_title": "JJ x Stranger Things",
-        "category_label": "Eyewear",
-        "tryon_enabled": request.GET.get("tryon") == "1",
-    }
-    context.update(filter_context)
-    return render(request, "store/promo_jj_stranger_things.html", context)
+    return promo_collection_view(request, "jj-x-stranger-things", "store/promo_jj_stranger_things.html")
 
 
+@catalog_conditional
 def brand_listing_view(request, slug):
-    brand = get_object_or_404(Brand, slug=slug, active=True)
-    base_products = Product.objects.filter(is_active=True, brand=brand)
-    products, filter_context = _build_filtered_products(request, base_products)
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-
-    filter_context["selected_brands"] = [brand.slug]
+    brand = cached_lookup(Brand, slug=slug, active=True)
+    if brand is None:
+        raise Http404("No Brand matches the given query.")
 
     context = {
         "brand": brand,
-        "page_obj": page_obj,
+        "brand_summary": cached_lookup(BrandSummary, brand=brand.id),
         "page_title": brand.name,
         "category_label": "Eyewear",
         "tryon_enabled": request.GET.get("tryon") == "1",
     }
-    context.update(filter_context)
+    context.update(_listing_context(request, f"brand:{brand.slug}", {"brand": [brand.slug]}, pinned=("brand",)))
     return render(request, "store/brand_listing.html", context)
 
 
-def promo_collection_view(request, slug, title, keyword):
-    base_products = Product.objects.filter(is_active=True).filter(
-        Q(name__icontains=keyword)
-        | Q(category__name__icontains=keyword)
-        | Q(brand__name__icontains=keyword)
-    )
-    products, filter_context = _build_filtered_products(request, base_products)
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+@catalog_conditional
+def promo_collection_view(request, slug, template="store/promo_collection_listing.html"):
+    collection = cached_lookup(PromoCollection, slug=slug, active=True)
+    if collection is None:
+        raise Http404("No PromoCollection matches the given query.")
 
     context = {
-        "page_obj": page_obj,
-        "page_title": title,
+        "page_title": collection.title,
         "category_label": "Eyewear",
         "tryon_enabled": request.GET.get("tryon") == "1",
         "promo_slug": slug,
     }
-    context.update(filter_context)
-    return render(request, "store/promo_collection_listing.html", context)
+    context.update(_listing_context(request, f"promo:{slug}", {"promo": [slug]}))
+    return render(request, template, context)
 
 
 def promo_all_switch_view(request):
-    return promo_collection_view(request, "all-switch", "All Switch", "switch")
+    return promo_collection_view(request, "all-switch")
 
 
 def promo_air_x_view(request):
-    return promo_collection_view(request, "air-x", "Air X", "air")
+    return promo_collection_view(request, "air-x")
 
 
 def promo_transparent_view(request):
-    return promo_collection_view(request, "transparents-eyeglasses", "Transparent Eyeglasses", "transparent")
+    return promo_collection_view(request, "transparents-eyeglasses")